@@ -11,9 +11,17 @@ from datetime import datetime
 import re
 import cv2
 import numpy as np
-from PIL import Image, ImageTk
+from PIL import Image, ImageTk, ImageDraw
 import json
+import csv
+import io
 import time
+import queue
+import random
+import http.client
+from collections import deque, Counter, OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
@@ -27,33 +35,52 @@ from passporteye import read_mrz
 # File config để lưu đường dẫn
 CONFIG_FILE = "mrz_config.json"
 
+# Giá trị mặc định cho các key trong config
+DEFAULT_CONFIG = {
+    'watch_folder': '',
+    'watch_folders': [],              # Thư mục lắng nghe thêm: "path" hoặc {"path", "recursive", "mode", "poll_interval"}
+    'process_folder': '',
+    'result_folder': 'mrz_results',   # Thư mục ghi kết quả (JSONL/CSV)
+    'result_format': 'jsonl',         # 'jsonl' hoặc 'csv'
+    'result_max_mb': 50,              # Xoay file khi vượt dung lượng này
+    'service_enabled': False,         # Bật API quét qua HTTP (localhost)
+    'service_host': '127.0.0.1',
+    'service_port': 8765,
+    'pms_url': '',                    # Endpoint Smile FO nhận danh sách khách (JSON)
+    'pms_api_key': '',
+    'pms_timeout': 10,
+    'pms_batch_size': 10,
+    'pms_max_retries': 3,
+    'quality_gate': 'flag',           # 'reject' | 'flag' | 'off' - kiểm tra ảnh trước khi OCR
+    'camera_source': 0,               # Camera tài liệu: số thứ tự camera hoặc đường dẫn / URL video
+    'camera_timeout': 30,             # Thời gian tối đa cho 1 lần đọc bằng camera (giây)
+    'preview_cache_mb': 32,           # Dung lượng tối đa cache ảnh xem trước (MB)
+}
+
 # ============= CONFIG MANAGER =============
 class ConfigManager:
     """Quản lý config - Lưu/Load đường dẫn"""
     
     @staticmethod
     def load_config():
-        """Load config từ file"""
+        """Load config từ file (key thiếu lấy từ DEFAULT_CONFIG)"""
+        config = dict(DEFAULT_CONFIG)
         try:
             if os.path.exists(CONFIG_FILE):
                 with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    config.update(json.load(f))
         except Exception as e:
             print(f"Lỗi load config: {e}")
         
-        return {
-            'watch_folder': '',
-            'process_folder': ''
-        }
+        return config
     
     @staticmethod
     def save_config(watch_folder, process_folder):
-        """Lưu config vào file"""
+        """Lưu config vào file (giữ nguyên các key khác)"""
         try:
-            config = {
-                'watch_folder': watch_folder,
-                'process_folder': process_folder
-            }
+            config = ConfigManager.load_config()
+            config['watch_folder'] = watch_folder
+            config['process_folder'] = process_folder
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=2, ensure_ascii=False)
             print(f"✅ Đã lưu config: {CONFIG_FILE}")
@@ -61,25 +88,205 @@ class ConfigManager:
             print(f"Lỗi save config: {e}")
 
 # ============= FOLDER WATCHER =============
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Loại filesystem mạng (Linux/macOS) → dùng polling thay cho event
+NETWORK_FS_TYPES = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afpfs', 'fuse.sshfs', 'davfs')
+
+def is_scan_image(file_path):
+    """File ảnh scan cần đọc (bỏ qua file tạm _rotated / _enhanced)"""
+    name = os.path.basename(file_path)
+    if not name.lower().endswith(IMAGE_EXTENSIONS):
+        return False
+    return '_rotated' not in name and '_enhanced' not in name
+
+def is_network_path(path):
+    """Đường dẫn nằm trên ổ mạng (UNC, ổ map SMB, mount cifs/nfs)"""
+    path = os.path.abspath(path)
+    if path.startswith('\\\\') or path.startswith('//'):
+        return True
+    
+    if os.name == 'nt':
+        drive = os.path.splitdrive(path)[0]
+        if not drive:
+            return False
+        try:
+            import ctypes
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == DRIVE_REMOTE
+        except Exception:
+            return False
+    
+    # Linux: tìm mount point dài nhất chứa path trong /proc/mounts
+    try:
+        best_mount, best_type = '', ''
+        with open('/proc/mounts', 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace('\\040', ' ')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > len(best_mount):
+                    best_mount, best_type = mount_point, parts[2]
+        return best_type in NETWORK_FS_TYPES
+    except OSError:
+        return False
+
+def normalize_watch_folders(config, primary_folder=''):
+    """
+    Danh sách thư mục lắng nghe từ config.
+    Mỗi phần tử: {'path', 'recursive', 'mode' ('auto' | 'native' | 'poll'), 'poll_interval'}
+    Thư mục chọn trên giao diện (primary_folder) luôn đứng đầu.
+    """
+    folders = []
+    seen = set()
+    
+    items = list(config.get('watch_folders') or [])
+    if primary_folder:
+        items.insert(0, primary_folder)
+    
+    for item in items:
+        if isinstance(item, str):
+            item = {'path': item}
+        path = item.get('path', '')
+        if not path:
+            continue
+        key = os.path.normcase(os.path.abspath(path))
+        if key in seen:
+            continue
+        seen.add(key)
+        
+        folders.append({
+            'path': path,
+            'recursive': bool(item.get('recursive', False)),
+            'mode': item.get('mode', 'auto'),
+            'poll_interval': float(item.get('poll_interval', 2.0)),
+        })
+    
+    return folders
+
+def iter_scan_images(folder, recursive=False):
+    """Liệt kê ảnh scan trong thư mục bằng os.scandir"""
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            yield from iter_scan_images(entry.path, recursive)
+                    elif entry.is_file() and is_scan_image(entry.name):
+                        yield entry.path
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"Lỗi đọc thư mục {folder}: {e}")
+
+def settle_pending(pending, settle_time):
+    """
+    Kiểm tra ảnh đang ghi {ảnh: (size, mtime_ns, lần đổi cuối)} (cập nhật tại chỗ).
+    Trả về ({ảnh đứng yên đủ settle_time giây: (size, mtime_ns)}, [ảnh đã mất])
+    """
+    ready = {}
+    gone = []
+    now = time.time()
+    for path, (size, mtime_ns, changed_at) in list(pending.items()):
+        try:
+            st = os.stat(path)
+        except OSError:
+            del pending[path]
+            gone.append(path)
+            continue
+        
+        if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+            pending[path] = (st.st_size, st.st_mtime_ns, now)
+        elif st.st_size > 0 and now - changed_at >= settle_time:
+            del pending[path]
+            ready[path] = (size, mtime_ns)
+    
+    return ready, gone
+
 class ImageFolderHandler(FileSystemEventHandler):
-    """Xử lý sự kiện khi có file mới trong thư mục"""
-    def __init__(self, app):
+    """
+    Xử lý sự kiện của watchdog Observer (thư mục local):
+    ảnh mới / đang ghi / vừa đổi tên được theo dõi đến khi size/mtime đứng yên
+    settle_time giây (giống ScandirPollingWatcher) rồi mới đưa vào hàng đợi
+    """
+    def __init__(self, app, settle_time=1.0, check_interval=0.25):
         self.app = app
         self.processed_files = set()
+        self.settle_time = settle_time
+        self.check_interval = check_interval
+        
+        self._pending = {}   # ảnh đang ghi → (size, mtime_ns, lần đổi cuối)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Chạy thread kiểm tra ảnh đã ghi xong (không chặn thread của Observer)"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._settle_loop, name="folder-settle", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
     
     def on_created(self, event):
         """Khi có file mới được tạo"""
         if event.is_directory:
             return
         
-        file_path = event.src_path
+        self.track(event.src_path)
+    
+    def on_modified(self, event):
+        """Khi file đang được ghi tiếp"""
+        if event.is_directory:
+            return
+        
+        self.track(event.src_path)
+    
+    def on_moved(self, event):
+        """Khi file được đổi tên (máy scan ghi file tạm rồi đổi tên)"""
+        if event.is_directory:
+            return
+        
+        # Tên tạm cũng là ảnh → bỏ, chỉ chờ dưới tên mới
+        with self._lock:
+            self._pending.pop(event.src_path, None)
+        self.track(event.dest_path)
+    
+    def track(self, file_path):
+        """Ghi nhận ảnh vừa thay đổi - mỗi sự kiện tính lại thời gian chờ"""
+        if not is_scan_image(file_path) or file_path in self.processed_files:
+            return
         
-        # Chỉ xử lý file ảnh
-        if not file_path.lower().endswith(('.jpg', '.jpeg', '.png')):
+        try:
+            st = os.stat(file_path)
+        except OSError:
             return
         
-        # Tránh xử lý file tạm
-        if '_rotated' in file_path or '_enhanced' in file_path:
+        with self._lock:
+            self._pending[file_path] = (st.st_size, st.st_mtime_ns, time.time())
+    
+    def _settle_loop(self):
+        while not self._stop.wait(self.check_interval):
+            with self._lock:
+                ready, _ = settle_pending(self._pending, self.settle_time)
+            
+            for file_path in ready:
+                try:
+                    self.handle_new_file(file_path)
+                except Exception as e:
+                    print(f"Lỗi xử lý file mới: {e}")
+    
+    def handle_new_file(self, file_path):
+        """Đưa ảnh đã ghi xong vào hàng đợi"""
+        # Chỉ xử lý file ảnh, tránh xử lý file tạm
+        if not is_scan_image(file_path):
             return
         
         # Tránh xử lý trùng
@@ -88,14 +295,421 @@ class ImageFolderHandler(FileSystemEventHandler):
         
         self.processed_files.add(file_path)
         
-        # Đợi file được ghi xong
-        time.sleep(0.5)
-        
         if os.path.exists(file_path):
             self.app.log(f"🔔 Phát hiện ảnh mới: {os.path.basename(file_path)}")
-            threading.Thread(target=self.app.process_images, 
-                           args=([file_path],), 
-                           daemon=True).start()
+            self.app.process_images([file_path], priority=PRIORITY_BACKGROUND)
+
+class ScandirPollingWatcher:
+    """
+    POLLING THEO CHỈ MỤC CHO Ổ MẠNG (SMB/NFS):
+    1. Lưu mtime của từng thư mục + (size, mtime) của từng ảnh
+    2. Mỗi tick chỉ stat các thư mục; chỉ liệt kê lại (scandir) thư mục có mtime đổi
+       → chi phí theo số thay đổi, không theo số file
+    3. Ảnh mới được theo dõi đến khi size/mtime đứng yên settle_time giây mới báo
+    4. Ảnh đã báo chỉ đổi tên (cùng size + mtime với file vừa mất) không báo lại;
+       ảnh chưa báo bị đổi tên thì tiếp tục chờ dưới tên mới
+    5. Định kỳ quét lại toàn bộ (full_rescan_interval) để bù các thay đổi bị lỡ
+    6. Chỉ mục ban đầu dựng trên thread polling (ổ mạng hàng chục nghìn file
+       không làm treo giao diện); size/mtime lấy từ DirEntry.stat() (Windows: miễn phí)
+    """
+    def __init__(self, on_new_file, poll_interval=2.0, settle_time=1.0,
+                 full_rescan_interval=60.0):
+        self.on_new_file = on_new_file
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.full_rescan_interval = full_rescan_interval
+        
+        self._roots = {}     # thư mục gốc → recursive
+        self._dirs = {}      # thư mục → (mtime_ns, thư mục gốc)
+        self._entries = {}   # thư mục → set ảnh trong thư mục (đã biết + đang ghi)
+        self._files = {}     # ảnh đã biết → (size, mtime_ns)
+        self._pending = {}   # ảnh mới đang ghi → (size, mtime_ns, lần đổi cuối)
+        self._hot_dirs = set()
+        self._new_roots = []  # (thư mục gốc, lúc thêm) chưa dựng chỉ mục
+        self._last_full_rescan = time.time()
+        
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def add_folder(self, path, recursive=False):
+        """
+        Thêm thư mục; chỉ mục được dựng ở tick đầu của thread polling.
+        Ảnh có sẵn (mtime trước lúc thêm) được ghi nhận nhưng không báo
+        """
+        with self._lock:
+            self._roots[path] = recursive
+            self._new_roots.append((path, time.time()))
+    
+    def start(self):
+        self._stop.clear()
+        self._last_full_rescan = time.time()
+        self._thread = threading.Thread(target=self._poll_loop, name="scandir-poller", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def stats(self):
+        """Số thư mục / ảnh đang theo dõi"""
+        with self._lock:
+            return {'dirs': len(self._dirs), 'files': len(self._files), 'pending': len(self._pending)}
+    
+    def _poll_loop(self):
+        # Tick đầu chạy ngay để dựng chỉ mục ban đầu
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Lỗi polling: {e}")
+            self._stop.wait(self.poll_interval)
+    
+    def poll_once(self):
+        """1 tick: tìm thư mục thay đổi → diff → kiểm tra ảnh đang ghi"""
+        ready = []
+        with self._lock:
+            full = time.time() - self._last_full_rescan >= self.full_rescan_interval
+            if full:
+                self._last_full_rescan = time.time()
+            
+            new_roots, self._new_roots = self._new_roots, []
+            for root, added_at in new_roots:
+                self._index_dir(root, root, since=added_at)
+            
+            hot, self._hot_dirs = self._hot_dirs, set()
+            for dir_path, (mtime_ns, root) in list(self._dirs.items()):
+                try:
+                    current = os.stat(dir_path).st_mtime_ns
+                except OSError:
+                    self._forget_dir(dir_path)
+                    continue
+                
+                if full or current != mtime_ns or dir_path in hot:
+                    self._rescan_dir(dir_path, root, current)
+            
+            ready = self._check_pending()
+        
+        for file_path in ready:
+            try:
+                self.on_new_file(file_path)
+            except Exception as e:
+                print(f"Lỗi xử lý file mới: {e}")
+    
+    def _index_dir(self, dir_path, root, since=0.0):
+        """Ghi nhận thư mục (và thư mục con nếu recursive) lần đầu"""
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return
+        self._dirs[dir_path] = (mtime_ns, root)
+        self._rescan_dir(dir_path, root, mtime_ns, since)
+    
+    def _rescan_dir(self, dir_path, root, mtime_ns, since=0.0):
+        """
+        Liệt kê lại 1 thư mục, so với chỉ mục để tìm ảnh mới / mất.
+        Ảnh mới có mtime trước since (chỉ mục ban đầu) coi là có sẵn, không báo
+        """
+        self._dirs[dir_path] = (mtime_ns, root)
+        recursive = self._roots.get(root, False)
+        
+        names = {}    # ảnh → DirEntry
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                subdirs.append(entry.path)
+                        elif is_scan_image(entry.name) and entry.is_file():
+                            names[entry.path] = entry
+                    except OSError:
+                        continue
+        except OSError:
+            self._forget_dir(dir_path)
+            return
+        
+        known = self._entries.get(dir_path, set())
+        
+        removed = {}          # ảnh đã báo bị mất → (size, mtime_ns)
+        removed_pending = {}  # ảnh chưa báo bị mất → lần đổi cuối
+        for path in known - names.keys():
+            if path in self._files:
+                removed[self._files.pop(path)] = path
+            elif path in self._pending:
+                size, mtime_ns, changed_at = self._pending.pop(path)
+                removed_pending[(size, mtime_ns)] = changed_at
+        
+        now = time.time()
+        for path in names.keys() - known:
+            try:
+                st = names[path].stat()
+            except OSError:
+                del names[path]
+                continue
+            key = (st.st_size, st.st_mtime_ns)
+            if st.st_mtime < since or key in removed:
+                # Ảnh có sẵn hoặc ảnh đã báo chỉ đổi tên → không báo lại
+                self._files[path] = key
+            elif key in removed_pending:
+                # Ảnh chưa báo bị đổi tên → chờ tiếp dưới tên mới
+                self._pending[path] = key + (removed_pending.pop(key),)
+            else:
+                self._pending[path] = key + (now,)
+        
+        names = set(names)
+        self._entries[dir_path] = names
+        
+        for subdir in subdirs:
+            if subdir not in self._dirs:
+                self._index_dir(subdir, root, since)
+        
+        # Thay đổi có thể xảy ra trong cùng khoảng mtime → xem lại ở tick sau
+        if not since and (names ^ known):
+            self._hot_dirs.add(dir_path)
+    
+    def _forget_dir(self, dir_path):
+        """Thư mục bị xóa → bỏ khỏi chỉ mục (cả thư mục con)"""
+        prefix = os.path.join(dir_path, '')
+        for path in [d for d in self._dirs if d == dir_path or d.startswith(prefix)]:
+            del self._dirs[path]
+            for file_path in self._entries.pop(path, ()):
+                self._files.pop(file_path, None)
+                self._pending.pop(file_path, None)
+    
+    def _check_pending(self):
+        """Ảnh có size/mtime đứng yên đủ lâu → sẵn sàng đọc"""
+        ready, gone = settle_pending(self._pending, self.settle_time)
+        for path in gone:
+            self._entries.get(os.path.dirname(path), set()).discard(path)
+        self._files.update(ready)
+        return list(ready)
+
+class FolderWatcher:
+    """
+    Lắng nghe nhiều thư mục: thư mục local dùng watchdog Observer (event),
+    ổ mạng (hoặc mode='poll') dùng ScandirPollingWatcher
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.observer = None
+        self.pollers = []
+        self.folders = []
+    
+    def start(self, folders):
+        """Bắt đầu lắng nghe, trả về list (folder, kiểu lắng nghe)"""
+        started = []
+        pollers = {}
+        
+        for folder in folders:
+            mode = folder['mode']
+            if mode == 'auto':
+                mode = 'poll' if is_network_path(folder['path']) else 'native'
+            
+            if mode == 'poll':
+                # Gộp các thư mục cùng chu kỳ vào 1 poller (1 thread)
+                interval = folder['poll_interval']
+                if interval not in pollers:
+                    pollers[interval] = ScandirPollingWatcher(
+                        self.handler.handle_new_file,
+                        poll_interval=interval)
+                pollers[interval].add_folder(folder['path'], folder['recursive'])
+            else:
+                if self.observer is None:
+                    self.observer = Observer()
+                self.observer.schedule(self.handler, folder['path'], recursive=folder['recursive'])
+            
+            started.append((folder, mode))
+        
+        if self.observer:
+            self.handler.start()
+            self.observer.start()
+        self.pollers = list(pollers.values())
+        for poller in self.pollers:
+            poller.start()
+        
+        self.folders = started
+        return started
+    
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+            self.handler.stop()
+        for poller in self.pollers:
+            poller.stop()
+        self.pollers = []
+        self.folders = []
+
+# ============= SCAN SCHEDULER =============
+# Làn ưu tiên: số nhỏ hơn = ưu tiên cao hơn
+PRIORITY_INTERACTIVE = 0   # Ảnh kéo thả - khách đang đứng tại quầy
+PRIORITY_BACKGROUND = 1    # Ảnh từ watcher / quét thư mục (backlog)
+
+# Số worker đọc MRZ chạy song song (tối thiểu 2: 1 worker dành riêng cho kéo thả)
+DEFAULT_SCAN_WORKERS = max(2, min(4, os.cpu_count() or 2))
+
+class ScanJob:
+    """
+    Một ảnh cần đọc MRZ, kèm làn ưu tiên và các mốc thời gian.
+    Ảnh là file (image_path) hoặc bytes trong bộ nhớ (image_bytes).
+    """
+    def __init__(self, image_path, priority=PRIORITY_BACKGROUND, image_bytes=None):
+        self.image_path = image_path
+        self.image_bytes = image_bytes
+        self.priority = priority
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        
+        # Kết quả (Guest hoặc None) - đặt bởi scheduler sau khi chạy xong
+        self.result = None
+        self.error = None
+        self.quality = None   # QualityReport (nếu có chạy quality gate)
+        self.cancelled = False
+        self.done = threading.Event()
+    
+    def wait(self, timeout=None):
+        """Đợi job xong, trả về True nếu xong trước timeout"""
+        return self.done.wait(timeout)
+    
+    def cancel(self):
+        """Bỏ job nếu chưa chạy (job đang chạy vẫn chạy tiếp)"""
+        self.cancelled = True
+    
+    def wait_time(self):
+        """Thời gian chờ trong hàng đợi (giây)"""
+        if self.started_at is None:
+            return 0.0
+        return self.started_at - self.submitted_at
+
+class ScanScheduler:
+    """
+    BỘ LẬP LỊCH QUÉT THEO LÀN ƯU TIÊN:
+    1. Mỗi làn (interactive / background) là một hàng đợi FIFO riêng
+    2. Worker luôn lấy job ở làn ưu tiên cao nhất đang có việc
+    3. Giữ riêng worker chỉ phục vụ làn interactive → ảnh kéo thả được đọc
+       ngay cả khi các worker khác đang bận với backlog thư mục
+    4. Backlog tiếp tục chạy nền trên các worker còn lại
+    """
+    def __init__(self, handler, num_workers=DEFAULT_SCAN_WORKERS,
+                 reserved_interactive=1, on_idle=None):
+        self.handler = handler
+        self.on_idle = on_idle
+        self.num_workers = max(2, num_workers)
+        self.reserved_interactive = max(0, min(reserved_interactive, self.num_workers - 1))
+        
+        self._lanes = {
+            PRIORITY_INTERACTIVE: deque(),
+            PRIORITY_BACKGROUND: deque(),
+        }
+        self._cond = threading.Condition()
+        self._active = 0
+        self._running = False
+        self._threads = []
+    
+    def start(self):
+        """Khởi động các worker"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        
+        all_lanes = tuple(sorted(self._lanes))
+        for i in range(self.num_workers):
+            lanes = (PRIORITY_INTERACTIVE,) if i < self.reserved_interactive else all_lanes
+            worker = threading.Thread(target=self._worker_loop, args=(lanes,),
+                                      name=f"scan-worker-{i}", daemon=True)
+            worker.start()
+            self._threads.append(worker)
+    
+    def stop(self, timeout=2.0):
+        """Dừng worker, bỏ các job chưa chạy"""
+        with self._cond:
+            self._running = False
+            for lane in self._lanes.values():
+                for job in lane:
+                    job.cancelled = True
+                    job.done.set()
+                lane.clear()
+            self._cond.notify_all()
+        
+        for worker in self._threads:
+            worker.join(timeout)
+        self._threads = []
+    
+    def submit(self, image_path, priority=PRIORITY_BACKGROUND, image_bytes=None):
+        """Đưa 1 ảnh vào làn tương ứng, trả về ScanJob"""
+        if priority not in self._lanes:
+            raise ValueError(f"Làn ưu tiên không hợp lệ: {priority}")
+        
+        job = ScanJob(image_path, priority, image_bytes)
+        with self._cond:
+            self._lanes[priority].append(job)
+            self._cond.notify_all()
+        return job
+    
+    def pending_count(self, priority=None):
+        """Số job đang chờ (của 1 làn hoặc tất cả)"""
+        with self._cond:
+            if priority is not None:
+                return len(self._lanes[priority])
+            return sum(len(lane) for lane in self._lanes.values())
+    
+    def active_count(self):
+        """Số job đang được xử lý"""
+        with self._cond:
+            return self._active
+    
+    def is_idle(self):
+        """Không còn job chờ và không có job đang chạy"""
+        with self._cond:
+            return self._active == 0 and not any(self._lanes.values())
+    
+    def _next_job(self, lanes):
+        """Lấy job ở làn ưu tiên cao nhất mà worker được phép phục vụ"""
+        for priority in lanes:
+            lane = self._lanes[priority]
+            while lane:
+                job = lane.popleft()
+                if job.cancelled:
+                    job.done.set()
+                    continue
+                return job
+        return None
+    
+    def _worker_loop(self, lanes):
+        """Vòng lặp của 1 worker"""
+        while True:
+            with self._cond:
+                job = self._next_job(lanes)
+                while job is None and self._running:
+                    self._cond.wait()
+                    job = self._next_job(lanes)
+                
+                if job is None:
+                    return
+                self._active += 1
+            
+            job.started_at = time.time()
+            try:
+                job.result = self.handler(job)
+            except Exception as e:
+                job.error = e
+                print(f"Lỗi worker: {e}")
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+                with self._cond:
+                    self._active -= 1
+                    idle = self._active == 0 and not any(self._lanes.values())
+                
+                if idle and self.on_idle:
+                    self.on_idle()
 
 # ============= GUEST MODEL (OOP) =============
 class Guest:
@@ -108,14 +722,296 @@ class Guest:
         self.issuing_country = issuing_country
         self.nationality = nationality
         self.source_image = source_image
+        self.source_path = ''   # Đường dẫn đầy đủ (để xem trước ảnh gốc)
         self.scan_time = datetime.now().strftime("%H:%M:%S")
+        self.scanned_at = datetime.now().isoformat(timespec='seconds')
+        
+        # Độ tin cậy (valid_score của PassportEye, 0-100) và cách đọc được
+        self.confidence = None
+        self.method = ''
+        
+        # Trạng thái gửi Smile FO (xem PMS_STATUS_LABELS)
+        self.pms_status = ''
     
     def __str__(self):
         return f"{self.full_name} - {self.passport_number}"
+    
+    def to_dict(self):
+        """Chuyển thành dict để xuất JSON/CSV"""
+        return {
+            'full_name': self.full_name,
+            'passport_number': self.passport_number,
+            'dob': self.dob,
+            'gender': self.gender,
+            'issuing_country': self.issuing_country,
+            'nationality': self.nationality,
+            'source_image': self.source_image,
+            'scanned_at': self.scanned_at,
+            'confidence': self.confidence,
+            'method': self.method,
+        }
+
+# ============= RESULT SINK =============
+# Thứ tự cột khi xuất kết quả (CSV dùng làm header)
+RESULT_FIELDS = [
+    'scanned_at', 'full_name', 'passport_number', 'dob', 'gender',
+    'issuing_country', 'nationality', 'source_image',
+    'confidence', 'method', 'lane', 'wait_ms', 'read_ms', 'total_ms',
+]
+
+RESULT_FILE_PREFIX = "mrz_results_"
+
+def build_result_record(guest, job=None):
+    """Gộp thông tin Guest + thời gian xử lý của ScanJob thành 1 record"""
+    record = guest.to_dict()
+    
+    if job is not None:
+        now = job.finished_at or time.time()
+        started = job.started_at or now
+        record['lane'] = 'interactive' if job.priority == PRIORITY_INTERACTIVE else 'background'
+        record['wait_ms'] = int(job.wait_time() * 1000)
+        record['read_ms'] = int((now - started) * 1000)
+        record['total_ms'] = int((now - job.submitted_at) * 1000)
+    
+    return {field: record.get(field) for field in RESULT_FIELDS}
+
+class ResultSink:
+    """
+    GHI KẾT QUẢ APPEND-ONLY THEO LÔ:
+    1. write() chỉ đưa record vào buffer → luồng quét không phải chờ disk
+    2. Luồng nền gom buffer, ghi 1 lần + fsync 1 lần cho cả lô
+    3. Mỗi ngày 1 file; vượt max_bytes thì chuyển sang file _001, _002...
+    4. Mỗi dòng là 1 record hoàn chỉnh → có thể tail file khi đang ghi
+    
+    Lớp con chỉ cần định nghĩa extension, format_record() và header().
+    """
+    extension = ''
+    
+    def __init__(self, folder, max_bytes=50 * 1024 * 1024,
+                 flush_interval=1.0, batch_size=64):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._closed = False
+        
+        self._file = None
+        self._file_day = None
+        self._file_index = 0
+        self._file_size = 0
+        
+        os.makedirs(self.folder, exist_ok=True)
+        self._thread = threading.Thread(target=self._flush_loop,
+                                        name="result-sink", daemon=True)
+        self._thread.start()
+    
+    def format_record(self, record):
+        """Chuyển 1 record thành 1 dòng text (kết thúc bằng \\n)"""
+        raise NotImplementedError
+    
+    def header(self):
+        """Dòng đầu file mới (nếu có)"""
+        return ''
+    
+    def write(self, record):
+        """Đưa record vào buffer (không chặn)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+    
+    def flush(self):
+        """Ghi ngay toàn bộ buffer xuống disk"""
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write_batch(batch)
+    
+    def close(self):
+        """Ghi nốt buffer và đóng file"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        
+        self._thread.join(self.flush_interval + 5)
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+    
+    def current_path(self):
+        """Đường dẫn file đang ghi (theo ngày + index)"""
+        return self._path_for(self._file_day or datetime.now().strftime("%Y-%m-%d"),
+                              self._file_index)
+    
+    def _path_for(self, day, index):
+        suffix = f"_{index:03d}" if index else ""
+        return os.path.join(self.folder, f"{RESULT_FILE_PREFIX}{day}{suffix}{self.extension}")
+    
+    def _flush_loop(self):
+        """Luồng nền: gom buffer theo chu kỳ hoặc khi đủ batch_size"""
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+                closed = self._closed
+            
+            if batch:
+                self._write_batch(batch)
+            if closed:
+                return
+    
+    def _write_batch(self, batch):
+        """Ghi 1 lô record + fsync 1 lần"""
+        try:
+            data = ''.join(self.format_record(record) for record in batch)
+            self._open_for(len(data.encode('utf-8')))
+            
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file_size += len(data.encode('utf-8'))
+        except Exception as e:
+            print(f"Lỗi ghi kết quả: {e}")
+    
+    def _open_for(self, incoming_bytes):
+        """Mở file phù hợp: đổi ngày hoặc vượt dung lượng thì xoay file"""
+        day = datetime.now().strftime("%Y-%m-%d")
+        
+        if day != self._file_day:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._file_day = day
+            self._file_index = 0
+            # Nối tiếp file cuối cùng của ngày (khi mở lại app)
+            while os.path.exists(self._path_for(day, self._file_index + 1)):
+                self._file_index += 1
+        
+        path = self._path_for(self._file_day, self._file_index)
+        
+        if self._file is None:
+            self._file_size = os.path.getsize(path) if os.path.exists(path) else 0
+        
+        if self._file_size and self._file_size + incoming_bytes > self.max_bytes:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._file_index += 1
+            path = self._path_for(self._file_day, self._file_index)
+            self._file_size = 0
+        
+        if self._file is None:
+            self._file = open(path, 'a', encoding='utf-8', newline='')
+            if self._file_size == 0:
+                header = self.header()
+                if header:
+                    self._file.write(header)
+                    self._file_size += len(header.encode('utf-8'))
+
+class JsonlResultSink(ResultSink):
+    """Mỗi dòng 1 JSON object"""
+    extension = '.jsonl'
+    
+    def format_record(self, record):
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+class CsvResultSink(ResultSink):
+    """CSV với header RESULT_FIELDS"""
+    extension = '.csv'
+    
+    def _csv_line(self, values):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerow(values)
+        return buf.getvalue()
+    
+    def header(self):
+        return self._csv_line(RESULT_FIELDS)
+    
+    def format_record(self, record):
+        return self._csv_line(['' if record.get(f) is None else record.get(f)
+                               for f in RESULT_FIELDS])
+
+RESULT_SINKS = {
+    'jsonl': JsonlResultSink,
+    'csv': CsvResultSink,
+}
+
+def create_result_sink(config):
+    """Tạo sink theo config (result_folder rỗng = tắt ghi kết quả)"""
+    folder = config.get('result_folder')
+    if not folder:
+        return None
+    
+    fmt = str(config.get('result_format', 'jsonl')).lower()
+    sink_class = RESULT_SINKS.get(fmt)
+    if sink_class is None:
+        print(f"Định dạng kết quả không hỗ trợ: {fmt} → dùng jsonl")
+        sink_class = JsonlResultSink
+    
+    max_bytes = int(float(config.get('result_max_mb', 50)) * 1024 * 1024)
+    return sink_class(folder, max_bytes=max_bytes)
+
+def list_result_files(folder, extension='.jsonl'):
+    """Danh sách file kết quả theo thứ tự ghi (ngày, index)"""
+    if not os.path.isdir(folder):
+        return []
+    
+    # Tên file dạng <prefix>YYYY-MM-DD[_NNN].ext → sort chữ cái là đúng thứ tự
+    files = sorted(f for f in os.listdir(folder)
+                   if f.startswith(RESULT_FILE_PREFIX) and f.endswith(extension))
+    return [os.path.join(folder, f) for f in files]
+
+class ResultTailer:
+    """
+    Đọc tiếp các record mới của 1 file kết quả (dùng cho job import PMS).
+    Chỉ trả về dòng đã ghi đủ (có \\n), dòng dở dang để lần đọc sau.
+    """
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+        self._header = None
+    
+    def read_new(self):
+        """Trả về list record mới kể từ lần đọc trước"""
+        if not os.path.exists(self.path):
+            return []
+        
+        with open(self.path, 'rb') as f:
+            if self._header is None and self.offset > 0 and self.path.endswith('.csv'):
+                self._header = next(csv.reader([f.readline().decode('utf-8')]))
+            f.seek(self.offset)
+            data = f.read()
+        
+        end = data.rfind(b'\n')
+        if end < 0:
+            return []
+        
+        chunk = data[:end + 1]
+        self.offset += len(chunk)
+        lines = chunk.decode('utf-8').splitlines()
+        
+        if self.path.endswith('.csv'):
+            return self._parse_csv(lines)
+        return [json.loads(line) for line in lines if line.strip()]
+    
+    def _parse_csv(self, lines):
+        rows = list(csv.reader(lines))
+        if self._header is None and rows:
+            self._header = rows.pop(0)
+        return [dict(zip(self._header, row)) for row in rows]
 
 # ============= IMAGE PREPROCESSING =============
 
-def enhance_mrz_region(image_path):
+def enhance_mrz_array(img):
     """
     THUẬT TOÁN XỬ LÝ ẢNH THÔNG MINH:
     Tăng độ chính xác OCR cho vùng MRZ bằng cách:
@@ -124,52 +1020,60 @@ def enhance_mrz_region(image_path):
     3. Denoise (khử nhiễu)
     4. Tăng độ tương phản (CLAHE)
     5. Binary threshold (chỉ giữ chữ đen/trắng)
+    
+    Nhận và trả về ảnh numpy (BGR vào, grayscale ra)
     """
+    height, width = img.shape[:2]
+    
+    # Xoay nếu ảnh dọc
+    if height > width:
+        img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+        height, width = img.shape[:2]
+    
+    # Bước 1: Crop vùng MRZ (25% dưới cùng)
+    mrz_height = int(height * 0.25)
+    mrz_region = img[height - mrz_height:, :]
+    
+    # Bước 2: Convert sang grayscale
+    gray = cv2.cvtColor(mrz_region, cv2.COLOR_BGR2GRAY)
+    
+    # Bước 3: Tăng kích thước 3x (làm chữ to, dễ nhận diện)
+    scale_factor = 3.0
+    enlarged = cv2.resize(gray, None, fx=scale_factor, fy=scale_factor, 
+                        interpolation=cv2.INTER_CUBIC)
+    
+    # Bước 4: Denoise (khử nhiễu background)
+    denoised = cv2.fastNlMeansDenoising(enlarged, None, h=10, 
+                                       templateWindowSize=7, 
+                                       searchWindowSize=21)
+    
+    # Bước 5: Tăng độ tương phản bằng CLAHE
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    contrasted = clahe.apply(denoised)
+    
+    # Bước 6: Binary threshold (chỉ giữ đen/trắng)
+    # Dùng Otsu để tự động tìm threshold tối ưu
+    _, binary = cv2.threshold(contrasted, 0, 255, 
+                             cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    
+    # Bước 7: Morphology để làm sạch chữ
+    kernel = np.ones((2, 2), np.uint8)
+    cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    
+    # Bước 8: Đảo màu nếu background là đen
+    if np.mean(cleaned) < 127:
+        cleaned = cv2.bitwise_not(cleaned)
+    
+    return cleaned
+
+def enhance_mrz_region(image_path):
+    """Enhance vùng MRZ của file ảnh, lưu ra file _enhanced.jpg"""
     try:
         img = cv2.imread(image_path)
         if img is None:
             return image_path
         
-        height, width = img.shape[:2]
-        
-        # Xoay nếu ảnh dọc
-        if height > width:
-            img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-            height, width = img.shape[:2]
-        
-        # Bước 1: Crop vùng MRZ (25% dưới cùng)
-        mrz_height = int(height * 0.25)
-        mrz_region = img[height - mrz_height:, :]
-        
-        # Bước 2: Convert sang grayscale
-        gray = cv2.cvtColor(mrz_region, cv2.COLOR_BGR2GRAY)
-        
-        # Bước 3: Tăng kích thước 3x (làm chữ to, dễ nhận diện)
-        scale_factor = 3.0
-        enlarged = cv2.resize(gray, None, fx=scale_factor, fy=scale_factor, 
-                            interpolation=cv2.INTER_CUBIC)
-        
-        # Bước 4: Denoise (khử nhiễu background)
-        denoised = cv2.fastNlMeansDenoising(enlarged, None, h=10, 
-                                           templateWindowSize=7, 
-                                           searchWindowSize=21)
-        
-        # Bước 5: Tăng độ tương phản bằng CLAHE
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        contrasted = clahe.apply(denoised)
-        
-        # Bước 6: Binary threshold (chỉ giữ đen/trắng)
-        # Dùng Otsu để tự động tìm threshold tối ưu
-        _, binary = cv2.threshold(contrasted, 0, 255, 
-                                 cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # Bước 7: Morphology để làm sạch chữ
-        kernel = np.ones((2, 2), np.uint8)
-        cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        
-        # Bước 8: Đảo màu nếu background là đen
-        if np.mean(cleaned) < 127:
-            cleaned = cv2.bitwise_not(cleaned)
+        cleaned = enhance_mrz_array(img)
         
         # Lưu ảnh đã xử lý
         enhanced_path = image_path.rsplit('.', 1)[0] + '_enhanced.jpg'
@@ -181,6 +1085,76 @@ def enhance_mrz_region(image_path):
         print(f"Lỗi enhance: {e}")
         return image_path
 
+# Góc nghiêng tối đa cần tìm và góc tối thiểu mới xoay (độ)
+DESKEW_MAX_ANGLE = 10.0
+DESKEW_MIN_ANGLE = 0.3
+
+def _projection_score(mask, angle):
+    """Độ "sắc" của histogram theo hàng sau khi xoay mask một góc"""
+    height, width = mask.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    rotated = cv2.warpAffine(mask, matrix, (width, height), flags=cv2.INTER_NEAREST)
+    profile = rotated.sum(axis=1, dtype=np.float64)
+    return float(np.sum(np.diff(profile) ** 2))
+
+def estimate_mrz_skew(gray):
+    """
+    ƯỚC LƯỢNG GÓC NGHIÊNG CỦA VÙNG MRZ (trên ảnh xám ~600px):
+    1. Lấy dải MRZ (locate_mrz_band) hoặc 35% dưới cùng nếu không tìm thấy
+    2. Blackhat + Otsu → mask chữ
+    3. Tìm góc làm histogram theo hàng sắc nhất: bước 1° rồi tinh chỉnh 0.1°
+    Trả về góc (độ) cần xoay để dòng MRZ nằm ngang
+    """
+    height, width = gray.shape[:2]
+    box = locate_mrz_band(gray)
+    if box is not None:
+        x, y, w, h = box
+        pad = max(h, 10)
+        region = gray[max(0, y - pad):min(height, y + h + pad), :]
+    else:
+        region = gray[int(height * 0.65):, :]
+    
+    if region.size == 0:
+        return 0.0
+    
+    rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5))
+    blackhat = cv2.morphologyEx(region, cv2.MORPH_BLACKHAT, rect_kernel)
+    _, mask = cv2.threshold(blackhat, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if not mask.any():
+        return 0.0
+    
+    # Tìm thô rồi tìm mịn quanh góc tốt nhất
+    coarse = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + 0.5, 1.0)
+    best = max(coarse, key=lambda a: _projection_score(mask, a))
+    fine = np.arange(best - 1.0, best + 1.05, 0.1)
+    best = max(fine, key=lambda a: _projection_score(mask, a))
+    
+    return round(float(best), 1)
+
+def deskew_image(img):
+    """Xoay ngang ảnh dọc + chỉnh nghiêng nhỏ theo MRZ, trả về (ảnh, góc đã xoay)"""
+    height, width = img.shape[:2]
+    
+    # Nếu ảnh dọc (chiều cao > chiều rộng), xoay 90 độ
+    if height > width:
+        img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+        height, width = img.shape[:2]
+    
+    # Ước lượng góc trên ảnh nhỏ (nhanh), xoay ảnh gốc
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    scale = QUALITY_THUMB_WIDTH / float(width)
+    small = cv2.resize(gray, (QUALITY_THUMB_WIDTH, max(1, int(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    angle = estimate_mrz_skew(small)
+    
+    if abs(angle) < DESKEW_MIN_ANGLE:
+        return img, 0.0
+    
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    deskewed = cv2.warpAffine(img, matrix, (width, height),
+                              flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return deskewed, angle
+
 def rotate_image_if_needed(image_path):
     """Tự động xoay ảnh nếu bị nghiêng hoặc dọc"""
     try:
@@ -189,10 +1163,12 @@ def rotate_image_if_needed(image_path):
             return image_path
         
         height, width = img.shape[:2]
+        img_rotated, angle = deskew_image(img)
         
-        # Nếu ảnh dọc (chiều cao > chiều rộng), xoay 90 độ
-        if height > width:
-            img_rotated = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+        # Ảnh dọc hoặc bị nghiêng → lưu ảnh đã xoay
+        if height > width or angle:
+            if angle:
+                print(f"📐 Chỉnh nghiêng {angle:+.1f}°")
             
             rotated_path = image_path.rsplit('.', 1)[0] + '_rotated.jpg'
             cv2.imwrite(rotated_path, img_rotated)
@@ -204,6 +1180,513 @@ def rotate_image_if_needed(image_path):
         print(f"Lỗi xoay: {e}")
         return image_path
 
+# ============= QUALITY GATE =============
+# Ngưỡng đánh giá chất lượng (tính trên thumbnail rộng QUALITY_THUMB_WIDTH px)
+QUALITY_THUMB_WIDTH = 600
+QUALITY_MIN_SHARPNESS = 0.08      # Var(Laplacian) / Var(độ sáng) tối thiểu trên vùng MRZ
+QUALITY_BAND_WIDTH = 400          # Vùng MRZ được đưa về chiều rộng này trước khi đo độ nét
+# Độ sáng đo trên vùng MRZ (không tính nền máy scan quanh giấy tờ)
+QUALITY_MIN_BRIGHTNESS = 45       # Độ sáng nền giấy (percentile 95) tối thiểu (0-255)
+QUALITY_MAX_INK = 170             # Độ sáng nét chữ (percentile 5) tối đa - cao hơn là chữ bị chói mất
+QUALITY_MIN_MRZ_WIDTH = 0.5       # Dòng MRZ rộng tối thiểu (tỉ lệ chiều rộng giấy tờ)
+QUALITY_MIN_MRZ_PAGE_WIDTH = 0.35 # ... khi không tách được giấy tờ khỏi nền (tỉ lệ chiều rộng ảnh)
+# Không thấy MRZ: số đo cả ảnh chỉ dùng để báo nguyên nhân
+QUALITY_MIN_CLIPPED = 0.05        # Chỉ báo "chói" khi có ít nhất ngần này pixel cháy (>= 250)
+QUALITY_MIN_CONTRAST = 8.0        # Chỉ báo "mờ" khi ảnh có nội dung (độ lệch chuẩn độ sáng)
+
+QUALITY_MESSAGES = {
+    'unreadable': "Không mở được ảnh",
+    'dark': "Ảnh quá tối",
+    'overexposed': "Ảnh quá sáng / bị chói",
+    'blurry': "Ảnh quá mờ",
+    'no_mrz': "Không tìm thấy vùng MRZ",
+}
+
+class QualityReport:
+    """Kết quả đánh giá chất lượng ảnh trước khi OCR"""
+    def __init__(self, ok, reason='', metrics=None, mrz_box=None, elapsed_ms=0):
+        self.ok = ok
+        self.reason = reason
+        self.message = QUALITY_MESSAGES.get(reason, reason)
+        self.metrics = metrics or {}
+        self.mrz_box = mrz_box          # (x, y, w, h) trên thumbnail
+        self.elapsed_ms = elapsed_ms
+    
+    def __str__(self):
+        return "OK" if self.ok else self.message
+
+def load_thumbnail(image_path=None, image_bytes=None, width=QUALITY_THUMB_WIDTH, image=None,
+                   rotate=True):
+    """
+    Đọc ảnh grayscale ở độ phân giải thấp (JPEG được giải mã thẳng ở 1/4 kích thước),
+    xoay ngang nếu ảnh dọc (rotate=True), rồi resize về chiều rộng cố định.
+    image: ảnh numpy có sẵn (VD: frame camera) thay cho file / bytes
+    """
+    flag = cv2.IMREAD_REDUCED_GRAYSCALE_4
+    if image is not None:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    elif image_bytes is not None:
+        gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    else:
+        gray = cv2.imread(image_path, flag)
+    
+    if gray is None:
+        return None
+    
+    height, w = gray.shape[:2]
+    if rotate and height > w:
+        gray = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+        height, w = gray.shape[:2]
+    
+    scale = width / float(w)
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    return cv2.resize(gray, (width, max(1, int(height * scale))), interpolation=interpolation)
+
+def locate_document(gray):
+    """
+    Tìm vùng giấy tờ trên trang scan (VD: passport đặt 1 góc mặt kính A4):
+    nền máy scan = màu viền ảnh, giấy tờ = vùng liền khối khác màu nền.
+    Trả về (x, y, w, h) hoặc None nếu giấy tờ chiếm gần hết ảnh / cùng màu nền
+    """
+    height, width = gray.shape[:2]
+    edge = max(2, min(height, width) // 100)
+    border = np.concatenate([gray[:edge].ravel(), gray[-edge:].ravel(),
+                             gray[:, :edge].ravel(), gray[:, -edge:].ravel()])
+    bed = float(np.median(border))
+    
+    diff = cv2.absdiff(cv2.GaussianBlur(gray, (5, 5), 0), np.full_like(gray, int(round(bed))))
+    mask = (diff > 4).astype(np.uint8) * 255
+    # Bỏ bụi / nhiễu nhỏ trên mặt kính
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return None
+    
+    x, y, w, h = cv2.boundingRect(points)
+    if w * h > 0.9 * width * height:
+        return None
+    # Chỉ có chữ / ảnh rời rạc khác màu nền → giấy tờ cùng màu nền, không tách được
+    if cv2.countNonZero(mask[y:y + h, x:x + w]) < 0.6 * w * h:
+        return None
+    return (x, y, w, h)
+
+def locate_mrz_band(gray, find_document=True):
+    """
+    TÌM VÙNG MRZ TRÊN ẢNH GRAYSCALE NHỎ (~600px):
+    1. Blackhat → làm nổi chữ tối trên nền sáng
+    2. Sobel theo trục x → dòng chữ MRZ có gradient ngang dày đặc
+    3. Close + Otsu → các ký tự dính thành dải
+    4. Chọn dải dẹt (rộng/cao > 5) và rộng >= 50% giấy tờ
+       (giấy tờ có thể chỉ chiếm 1 góc trang scan → đo theo locate_document,
+       không tách được giấy tờ thì >= 35% ảnh)
+    5. Gộp các dòng MRZ sát nhau (TD1 có 3 dòng) thành 1 vùng
+    Giấy tờ nhỏ so với trang (passport trên mặt kính A4) → cắt vùng giấy tờ,
+    phóng về cùng chiều rộng rồi tìm lại để chữ MRZ đủ lớn.
+    Trả về (x, y, w, h) hoặc None
+    """
+    height, width = gray.shape[:2]
+    document = locate_document(gray) if find_document else None
+    if document is not None and document[2] < 0.6 * width:
+        dx, dy, dw, dh = document
+        scale = width / float(dw)
+        crop = cv2.resize(gray[dy:dy + dh, dx:dx + dw], (width, max(1, int(dh * scale))),
+                          interpolation=cv2.INTER_LINEAR)
+        box = locate_mrz_band(crop, find_document=False)
+        if box is None:
+            return None
+        x, y, w, h = box
+        return (dx + int(x / scale), dy + int(y / scale),
+                max(1, int(w / scale)), max(1, int(h / scale)))
+    
+    rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5))
+    sq_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (21, 21))
+    
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    blackhat = cv2.morphologyEx(blurred, cv2.MORPH_BLACKHAT, rect_kernel)
+    
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    max_grad = grad.max()
+    if max_grad <= 0:
+        return None
+    grad = (255 * grad / max_grad).astype(np.uint8)
+    
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, rect_kernel)
+    _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, sq_kernel)
+    thresh = cv2.erode(thresh, None, iterations=2)
+    
+    contours = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    candidates = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h > 0 and w / float(h) > 5:
+            candidates.append((x, y, w, h))
+    
+    if not candidates:
+        return None
+    if document is not None:
+        min_width = QUALITY_MIN_MRZ_WIDTH * document[2]
+    else:
+        min_width = QUALITY_MIN_MRZ_PAGE_WIDTH * width
+    lines = [box for box in candidates if box[2] > min_width]
+    if not lines:
+        return None
+    
+    # Bắt đầu từ dải thấp nhất (MRZ nằm cuối trang), gộp dần các dải ngay phía trên
+    lines.sort(key=lambda box: box[1], reverse=True)
+    x0, y0, w0, h0 = lines[0]
+    x1, y1 = x0 + w0, y0 + h0
+    for x, y, w, h in lines[1:]:
+        if y0 - (y + h) > 2 * max(h, 4):
+            break
+        x0, y0 = min(x0, x), min(y0, y)
+        x1, y1 = max(x1, x + w), max(y1, y + h)
+    
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def sharpness_score(gray):
+    """
+    Độ nét không phụ thuộc độ tương phản: Var(Laplacian) / Var(ảnh).
+    Chữ nét ~ 1-3, ảnh mờ không đọc được < 0.08
+    """
+    region = gray.astype(np.float64)
+    contrast = region.var()
+    if contrast < 1:
+        return 0.0
+    return float(cv2.Laplacian(region, cv2.CV_64F).var() / contrast)
+
+def assess_image_quality(image_path=None, image_bytes=None, image=None):
+    """
+    ĐÁNH GIÁ NHANH ẢNH TRƯỚC KHI OCR (vài ms trên thumbnail):
+    1. Vùng MRZ: có dải chữ MRZ hay không (ảnh dọc thử cả 2 hướng)
+    2. Độ sáng trên vùng MRZ: nền giấy quá tối / nét chữ bị chói
+       (nền trắng hoặc xám của máy scan quanh giấy tờ không ảnh hưởng)
+    3. Độ nét: phương sai Laplacian trên vùng MRZ
+    Không tìm thấy MRZ thì dùng số đo cả ảnh để báo nguyên nhân gần nhất
+    """
+    start = time.time()
+    
+    def report(ok, reason='', metrics=None, box=None):
+        return QualityReport(ok, reason, metrics, box, int((time.time() - start) * 1000))
+    
+    try:
+        # Frame camera đã nằm ngang; ảnh file giữ nguyên hướng để thử cả 2 hướng
+        gray = load_thumbnail(image_path, image_bytes, image=image, rotate=image is not None)
+    except Exception as e:
+        print(f"Lỗi đọc thumbnail: {e}")
+        gray = None
+    
+    if gray is None:
+        return report(False, 'unreadable')
+    
+    brightness = float(np.mean(gray))
+    sharpness = sharpness_score(gray)
+    metrics = {
+        'brightness': round(brightness, 1),
+        'sharpness': round(sharpness, 3),
+    }
+    
+    # Ảnh dọc: thử hướng xoay ngang trước (ảnh chụp passport đặt dọc), rồi hướng gốc (trang A4)
+    candidates = [gray]
+    if gray.shape[0] > gray.shape[1]:
+        candidates.insert(0, cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE))
+    
+    box = None
+    for view in candidates:
+        box = locate_mrz_band(view)
+        if box is not None:
+            gray = view
+            break
+    
+    if box is None:
+        # Ảnh tối / cháy sáng / mờ thường cũng không tìm được MRZ → báo đúng nguyên nhân
+        if brightness < QUALITY_MIN_BRIGHTNESS:
+            return report(False, 'dark', metrics)
+        # Trang trống / đồng màu cũng không có nét chữ → chỉ "chói" khi thật sự có pixel cháy
+        clipped = float(np.count_nonzero(gray >= 250)) / gray.size
+        metrics['clipped'] = round(clipped, 3)
+        if float(np.percentile(gray, 1)) > QUALITY_MAX_INK and clipped >= QUALITY_MIN_CLIPPED:
+            return report(False, 'overexposed', metrics)
+        # Trang trống không "mờ" - chỉ là không có MRZ
+        if sharpness < QUALITY_MIN_SHARPNESS and float(np.std(gray)) >= QUALITY_MIN_CONTRAST:
+            return report(False, 'blurry', metrics)
+        return report(False, 'no_mrz', metrics)
+    
+    x, y, w, h = box
+    pad = max(h // 2, 6)
+    band = gray[max(0, y - pad):y + h + pad, x:x + w]
+    ink, paper = np.percentile(band, (5, 95))
+    # Đo độ nét ở cùng cỡ chữ: MRZ nhỏ (giấy tờ chiếm 1 góc trang) không bị "nét giả" do thu nhỏ
+    scale = QUALITY_BAND_WIDTH / float(band.shape[1])
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    band_sharpness = sharpness_score(cv2.resize(band, (QUALITY_BAND_WIDTH, max(1, int(band.shape[0] * scale))),
+                                                interpolation=interpolation))
+    metrics.update({
+        'mrz_ink': round(float(ink), 1),
+        'mrz_paper': round(float(paper), 1),
+        'mrz_sharpness': round(band_sharpness, 3),
+    })
+    
+    if paper < QUALITY_MIN_BRIGHTNESS:
+        return report(False, 'dark', metrics, box)
+    if ink > QUALITY_MAX_INK:
+        return report(False, 'overexposed', metrics, box)
+    if band_sharpness < QUALITY_MIN_SHARPNESS:
+        return report(False, 'blurry', metrics, box)
+    
+    return report(True, '', metrics, box)
+
+# ============= MRZ PARSER =============
+# Giá trị ký tự cho check digit (ICAO 9303): 0-9 → 0-9, A-Z → 10-35, < → 0
+_MRZ_CHAR_VALUES = {c: i for i, c in enumerate("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ")}
+_MRZ_CHAR_VALUES['<'] = 0
+_MRZ_WEIGHTS = (7, 3, 1)
+
+# Sửa lỗi OCR theo loại trường: trường số / trường chữ
+_TO_DIGIT = str.maketrans("OQDUIL|ZSGBT", "000011125687")
+_TO_ALPHA = str.maketrans("0125864", "OIZSBGA")
+# Ký tự "lạ" OCR hay đọc nhầm thay cho filler '<'
+_TO_FILLER = str.maketrans("«‹()[]{}", "<<<<<<<<")
+
+# Các cặp dễ nhầm, dùng khi check digit sai để thử sửa 1 ký tự
+_DIGIT_CONFUSIONS = {
+    '0': '86', '1': '7', '2': '7', '3': '8', '5': '6', '6': '58',
+    '7': '12', '8': '036', '9': '8',
+}
+
+# (số dòng, độ dài dòng) → loại MRZ
+MRZ_FORMATS = {
+    (3, 30): 'TD1',
+    (2, 36): 'TD2',
+    (2, 44): 'TD3',
+}
+
+def mrz_check_digit(value):
+    """Tính check digit ICAO 9303 (trả về ký tự '0'-'9')"""
+    total = 0
+    for i, c in enumerate(value):
+        total += _MRZ_CHAR_VALUES.get(c, 0) * _MRZ_WEIGHTS[i % 3]
+    return str(total % 10)
+
+def _is_valid_yymmdd(value):
+    return (value.isdigit() and 1 <= int(value[2:4]) <= 12 and 1 <= int(value[4:6]) <= 31)
+
+def _repair_field(value, check, confusions, validator=None):
+    """
+    Kiểm tra trường theo check digit; nếu sai thử đổi 1 ký tự dễ nhầm trong giá trị.
+    Không bao giờ sửa chính check digit (sẽ "hợp thức hóa" giá trị bị đọc sai).
+    Trả về (giá trị, check, hợp lệ, đã sửa)
+    """
+    check = check.translate(_TO_DIGIT)
+    if check == '<':
+        check = '0'
+    
+    def acceptable(v):
+        return validator is None or validator(v)
+    
+    if mrz_check_digit(value) == check and acceptable(value):
+        return value, check, True, False
+    
+    candidates = []
+    for i, c in enumerate(value):
+        for alt in confusions.get(c, ''):
+            candidate = value[:i] + alt + value[i + 1:]
+            if mrz_check_digit(candidate) == check and acceptable(candidate):
+                candidates.append(candidate)
+    
+    # Chỉ nhận khi duy nhất 1 cách sửa → tránh "sửa" sai
+    if len(candidates) == 1:
+        return candidates[0], check, True, True
+    
+    return value, check, False, False
+
+def normalize_mrz_lines(text):
+    """Tách text OCR thành các dòng MRZ chuẩn hóa, đoán loại (TD1/TD2/TD3)"""
+    if not text:
+        return None, []
+    
+    lines = []
+    for line in text.upper().translate(_TO_FILLER).splitlines():
+        line = ''.join(line.split())
+        if len(line) >= 20:
+            lines.append(line)
+    
+    # Chọn định dạng có độ dài gần nhất với các dòng đọc được
+    best = None
+    for (count, length), fmt in MRZ_FORMATS.items():
+        if len(lines) < count:
+            continue
+        candidate = lines[-count:]
+        error = sum(abs(len(line) - length) for line in candidate)
+        if best is None or error < best[0]:
+            best = (error, fmt, length, candidate)
+    
+    if best is None or best[0] > 2 * len(best[3]):
+        return None, []
+    
+    _, fmt, length, candidate = best
+    return fmt, [line[:length].ljust(length, '<') for line in candidate]
+
+def _split_name(field):
+    """SURNAME<<GIVEN<NAMES → (surname, given_names)"""
+    field = field.translate(_TO_ALPHA).rstrip('<')
+    surname, _, given = field.partition('<<')
+    return surname, given
+
+def parse_mrz_text(text):
+    """
+    PARSER MRZ NATIVE (TD1 / TD2 / TD3 / visa):
+    1. Chuẩn hóa dòng, đoán loại theo số dòng + độ dài
+    2. Cắt trường theo vị trí chuẩn ICAO 9303
+    3. Sửa lỗi theo loại trường: ngày / check digit → số, quốc gia / tên → chữ
+    4. Kiểm tra check digit, thử sửa 1 ký tự dễ nhầm nếu sai - chỉ với trường mà
+       check digit tổng hợp kiểm chứng được (không sửa số giấy tờ, không sửa visa)
+    5. Trường đã sửa chỉ được tin khi check digit tổng hợp xác nhận,
+       nếu không → ghi vào 'unconfirmed' và kết quả không 'valid'
+    Trả về dict các trường (kèm 'valid', 'checks', 'repaired', 'unconfirmed') hoặc None
+    """
+    fmt, lines = normalize_mrz_lines(text)
+    if not fmt:
+        return None
+    
+    if fmt == 'TD1':
+        line1, line2, line3 = lines
+        doc_code = line1[0:2]
+        issuer = line1[2:5]
+        number, number_check = line1[5:14], line1[14]
+        optional1 = line1[15:30]
+        # Số giấy tờ dài > 9 ký tự: phần còn lại nằm đầu optional1, check digit ở cuối
+        if number_check == '<' and optional1.strip('<'):
+            extra = optional1.split('<', 1)[0]
+            number, number_check = number + extra[:-1], extra[-1:] or '<'
+        dob, dob_check = line2[0:6], line2[6]
+        sex = line2[7]
+        expiry, expiry_check = line2[8:14], line2[14]
+        nationality = line2[15:18]
+        composite_check = line2[29]
+        name = line3
+        # Vị trí bắt đầu của trường trong chuỗi composite
+        offsets = {'number': 0, 'dob': 25, 'expiry': 32}
+    else:
+        line1, line2 = lines
+        doc_code = line1[0:2]
+        issuer = line1[2:5]
+        name = line1[5:]
+        number, number_check = line2[0:9], line2[9]
+        nationality = line2[10:13]
+        dob, dob_check = line2[13:19], line2[19]
+        sex = line2[20]
+        expiry, expiry_check = line2[21:27], line2[27]
+        composite_check = line2[-1]
+        offsets = {'number': 0, 'dob': 10, 'expiry': 17}
+    
+    # Sửa theo loại trường
+    doc_code = doc_code.translate(_TO_ALPHA)
+    issuer = issuer.translate(_TO_ALPHA)
+    nationality = nationality.translate(_TO_ALPHA)
+    dob = dob.translate(_TO_DIGIT)
+    expiry = expiry.translate(_TO_DIGIT)
+    sex = {'H': 'M', 'E': 'F'}.get(sex, sex)
+    
+    read = {'number': number, 'dob': dob, 'expiry': expiry}   # giá trị trước khi sửa
+    has_composite = not doc_code.startswith('V')              # visa không có check digit tổng hợp
+    repaired = []
+    checks = {}
+    
+    def repair(field, value, check):
+        # Số giấy tờ nằm ở vị trí 0 của composite (cùng trọng số 7-3-1 với check riêng)
+        # → composite không bao giờ xác nhận được → chỉ kiểm tra, không sửa
+        confusions = _DIGIT_CONFUSIONS if has_composite and offsets[field] % 3 else {}
+        validator = _is_valid_yymmdd if field != 'number' else None
+        value, check, ok, fixed = _repair_field(value, check, confusions, validator)
+        if fixed:
+            repaired.append(field)
+        checks[field] = ok
+        return value, check
+    
+    number, number_check = repair('number', number, number_check)
+    dob, dob_check = repair('dob', dob, dob_check)
+    expiry, expiry_check = repair('expiry', expiry, expiry_check)
+    
+    # Hộ chiếu TD3: số cá nhân (optional data) có check digit riêng nếu không để trống
+    # (visa MRV-A không có check digit này)
+    if fmt == 'TD3' and not doc_code.startswith('V') and line2[28:42].strip('<'):
+        checks['optional'] = mrz_check_digit(line2[28:42]) == line2[42].translate(_TO_DIGIT)
+    
+    def composite_ok(values):
+        """Check digit tổng hợp đúng với bộ giá trị {trường: (giá trị, check)}"""
+        (n, n_check), (d, d_check), (e, e_check) = values['number'], values['dob'], values['expiry']
+        if fmt == 'TD1':
+            part1 = n + n_check + optional1 if len(n) == 9 else line1[5:30]
+            composite = part1 + d + d_check + e + e_check + line2[18:29]
+        else:
+            composite = n + n_check + d + d_check + e + e_check + line2[28:-1]
+        return mrz_check_digit(composite) == composite_check.translate(_TO_DIGIT)
+    
+    values = {'number': (number, number_check), 'dob': (dob, dob_check),
+              'expiry': (expiry, expiry_check)}
+    
+    # Check digit tổng hợp (visa không có) - tính lại từ các trường đã sửa
+    if has_composite:
+        checks['composite'] = composite_ok(values)
+    
+    def confirmed(field):
+        """
+        Composite xác nhận việc sửa khi:
+        - Trường không bắt đầu ở vị trí chia hết cho 3 trong composite (số giấy tờ thì có):
+          cùng trọng số 7-3-1 với check digit riêng → mọi cách sửa thỏa check riêng đều thỏa composite
+        - Giả thuyết "giá trị đúng, chính check digit bị đọc sai" không cũng thỏa composite
+        """
+        if not checks.get('composite') or offsets[field] % 3 == 0:
+            return False
+        original = read[field]
+        return not composite_ok(dict(values, **{field: (original, mrz_check_digit(original))}))
+    
+    unconfirmed = [field for field in repaired if not confirmed(field)]
+    
+    surname, given_names = _split_name(name)
+    
+    return {
+        'format': fmt,
+        'document_code': doc_code.rstrip('<'),
+        'issuing_country': issuer.replace('<', ''),
+        'nationality': nationality.replace('<', ''),
+        'surname': surname,
+        'given_names': given_names,
+        'number': number.replace('<', ''),
+        'dob': dob,
+        'sex': sex if sex in ('M', 'F') else '',
+        'expiry': expiry,
+        'checks': checks,
+        'valid': all(checks.values()) and not unconfirmed,
+        'repaired': len(repaired),
+        'unconfirmed': unconfirmed,
+    }
+
+def guest_from_mrz_fields(fields, source_image, method=''):
+    """Tạo Guest trực tiếp từ kết quả parse_mrz_text"""
+    full_name = f"{clean_name(fields['surname'])} {clean_name(fields['given_names'])}".strip()
+    
+    guest = Guest(
+        full_name=full_name,
+        passport_number=fields['number'],
+        dob=format_date_from_string(fields['dob']),
+        gender=fields['sex'],
+        issuing_country=fields['issuing_country'],
+        nationality=fields['nationality'],
+        source_image=source_image
+    )
+    
+    # Trường sửa mà chưa được composite xác nhận chỉ tính nửa điểm
+    checks = fields['checks']
+    if checks:
+        passed = sum(checks.values()) - 0.5 * len(fields.get('unconfirmed', ()))
+        guest.confidence = int(100 * passed / len(checks))
+    else:
+        guest.confidence = None
+    guest.method = method
+    return guest
+
 # ============= MRZ READER =============
 def fix_ocr_errors_smart(text):
     """
@@ -343,8 +1826,50 @@ def format_date_from_string(date_str):
     
     return date_str
 
-def read_mrz_from_image(image_path):
-    """Đọc MRZ và trả về Guest object - CHIẾN LƯỢC 2 LẦN ĐỌC"""
+def parse_mrz_object(mrz_obj):
+    """Parse native text OCR của PassportEye (mrz_obj.aux['text'])"""
+    aux = getattr(mrz_obj, 'aux', None) or {}
+    return parse_mrz_text(aux.get('text', ''))
+
+def guest_from_mrz(mrz_obj, source_image, method=''):
+    """
+    Chuyển MRZ object của PassportEye thành Guest (ưu tiên parser native khi
+    kết quả 'valid' - check digit đúng, trường đã sửa được composite xác nhận)
+    """
+    fields = parse_mrz_object(mrz_obj)
+    if fields and fields['valid']:
+        return guest_from_mrz_fields(fields, source_image, method)
+    
+    mrz_data = mrz_obj.to_dict()
+    if not mrz_data:
+        return None
+    
+    surname = clean_name(mrz_data.get('surname', ''))
+    given_names = clean_name(mrz_data.get('names', ''))
+    full_name = f"{surname} {given_names}".strip()
+    
+    sex = mrz_data.get('sex', '')
+    gender = 'M' if sex == 'M' else 'F' if sex == 'F' else ''
+    
+    guest = Guest(
+        full_name=full_name,
+        passport_number=mrz_data.get('number', ''),
+        dob=format_date_from_string(mrz_data.get('date_of_birth', '')),
+        gender=gender,
+        issuing_country=mrz_data.get('country', ''),
+        nationality=mrz_data.get('nationality', ''),
+        source_image=source_image
+    )
+    guest.confidence = getattr(mrz_obj, 'valid_score', None)
+    guest.method = method
+    
+    return guest
+
+def read_mrz_from_image(image_path, allow_enhance=True):
+    """
+    Đọc MRZ và trả về Guest object - CHIẾN LƯỢC 2 LẦN ĐỌC
+    allow_enhance=False: chỉ đọc 1 lần (VD: ảnh đã trượt quality gate)
+    """
     try:
         # Bước 1: Xoay ảnh nếu cần
         rotated_path = rotate_image_if_needed(image_path)
@@ -352,12 +1877,14 @@ def read_mrz_from_image(image_path):
         # CHIẾN LƯỢC 1: Thử đọc từ ảnh gốc (hoặc đã xoay) trước
         print("🔄 Thử đọc từ ảnh gốc...")
         mrz_obj = read_mrz(rotated_path)
+        method = 'original'
         
         # CHIẾN LƯỢC 2: Nếu thất bại, thử với ảnh đã enhance
-        if not mrz_obj:
+        if allow_enhance and not mrz_obj:
             print("🔄 Thử đọc từ ảnh enhanced...")
             enhanced_path = enhance_mrz_region(rotated_path)
             mrz_obj = read_mrz(enhanced_path)
+            method = 'enhanced'
             
             # Xóa file enhanced
             if enhanced_path != rotated_path and os.path.exists(enhanced_path):
@@ -373,51 +1900,938 @@ def read_mrz_from_image(image_path):
         
         print("✅ Đọc MRZ thành công!")
         
-        mrz_data = mrz_obj.to_dict()
-        if not mrz_data:
+        return guest_from_mrz(mrz_obj, os.path.basename(image_path), method)
+    except Exception as e:
+        print(f"Lỗi đọc MRZ: {e}")
+        return None
+
+def read_mrz_obj_from_array(img, image_bytes=None, allow_enhance=True):
+    """
+    Đọc MRZ từ ảnh numpy (không ghi file tạm), trả về (mrz_obj, method).
+    image_bytes: bytes gốc của ảnh (dùng lại nếu không phải xoay)
+    allow_enhance=False: chỉ đọc 1 lần (VD: frame camera - frame sau là lần thử tiếp)
+    """
+    # Bước 1: Xoay / chỉnh nghiêng nếu cần (giữ nguyên bytes gốc nếu không xoay)
+    height, width = img.shape[:2]
+    img, angle = deskew_image(img)
+    if height > width or angle or image_bytes is None:
+        if angle:
+            print(f"📐 Chỉnh nghiêng {angle:+.1f}°")
+        _, encoded = cv2.imencode('.png', img)
+        image_bytes = encoded.tobytes()
+    
+    # CHIẾN LƯỢC 1: Đọc từ ảnh gốc (PassportEye nhận được stream)
+    print("🔄 Thử đọc từ ảnh gốc...")
+    mrz_obj = read_mrz(io.BytesIO(image_bytes))
+    method = 'original'
+    
+    # CHIẾN LƯỢC 2: Nếu thất bại, thử với ảnh đã enhance
+    if allow_enhance and not mrz_obj:
+        print("🔄 Thử đọc từ ảnh enhanced...")
+        _, encoded = cv2.imencode('.png', enhance_mrz_array(img))
+        mrz_obj = read_mrz(io.BytesIO(encoded.tobytes()))
+        method = 'enhanced'
+    
+    return mrz_obj, method
+
+def read_mrz_from_bytes(image_bytes, source_name="upload", allow_enhance=True):
+    """Đọc MRZ từ ảnh trong bộ nhớ (không ghi file tạm) - CHIẾN LƯỢC 2 LẦN ĐỌC"""
+    try:
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            print("❌ Không giải mã được ảnh")
             return None
         
-        surname = clean_name(mrz_data.get('surname', ''))
-        given_names = clean_name(mrz_data.get('names', ''))
-        full_name = f"{surname} {given_names}".strip()
+        mrz_obj, method = read_mrz_obj_from_array(img, image_bytes, allow_enhance)
         
-        sex = mrz_data.get('sex', '')
-        gender = 'M' if sex == 'M' else 'F' if sex == 'F' else ''
+        if not mrz_obj:
+            print("❌ Không đọc được MRZ từ cả 2 phương pháp")
+            return None
         
-        guest = Guest(
-            full_name=full_name,
-            passport_number=mrz_data.get('number', ''),
-            dob=format_date_from_string(mrz_data.get('date_of_birth', '')),
-            gender=gender,
-            issuing_country=mrz_data.get('country', ''),
-            nationality=mrz_data.get('nationality', ''),
-            source_image=os.path.basename(image_path)
-        )
+        print("✅ Đọc MRZ thành công!")
         
-        return guest
+        return guest_from_mrz(mrz_obj, source_name, method)
     except Exception as e:
         print(f"Lỗi đọc MRZ: {e}")
         return None
 
+# ============= CAMERA CAPTURE =============
+class MRZFrameVoter:
+    """
+    GỘP KẾT QUẢ NHIỀU FRAME:
+    - Trường có check digit (số hộ chiếu, ngày sinh, ngày hết hạn): chỉ lấy giá trị đã qua kiểm tra
+      (bỏ giá trị sửa 1 ký tự chưa được composite xác nhận)
+    - Trường không có check digit (tên, quốc tịch, giới tính...): bỏ phiếu theo số frame
+    """
+    CHECKED_FIELDS = ('number', 'dob', 'expiry')
+    VOTED_FIELDS = ('format', 'document_code', 'issuing_country', 'nationality',
+                    'surname', 'given_names', 'sex')
+    
+    def __init__(self):
+        self.frames = 0
+        self._votes = {field: Counter() for field in self.CHECKED_FIELDS + self.VOTED_FIELDS}
+    
+    def add(self, fields):
+        """Thêm kết quả parse_mrz_text của 1 frame"""
+        self.frames += 1
+        for field in self.CHECKED_FIELDS:
+            if fields['checks'].get(field) and field not in fields.get('unconfirmed', ()):
+                self._votes[field][fields[field]] += 1
+        for field in self.VOTED_FIELDS:
+            if fields.get(field):
+                self._votes[field][fields[field]] += 1
+    
+    def result(self):
+        """Kết quả gộp (cùng dạng parse_mrz_text) hoặc None nếu còn trường chưa qua check digit"""
+        if any(not self._votes[field] for field in self.CHECKED_FIELDS):
+            return None
+        
+        fields = {}
+        for field, votes in self._votes.items():
+            fields[field] = votes.most_common(1)[0][0] if votes else ''
+        fields['checks'] = {field: True for field in self.CHECKED_FIELDS}
+        fields['valid'] = True
+        fields['repaired'] = 0
+        fields['unconfirmed'] = []
+        return fields
+
+class VideoMRZCapture:
+    """
+    ĐỌC MRZ LIÊN TỤC TỪ CAMERA / FILE VIDEO:
+    1. Thread grab đọc frame liên tục, chỉ giữ frame mới nhất (frame cũ bị bỏ khi đang đọc)
+    2. Thread đọc lấy frame mới nhất, bỏ qua frame đang rung (lệch nhiều so với frame trước)
+       hoặc không qua quality gate (mờ / không thấy MRZ) → chỉ OCR frame có triển vọng
+    3. OCR 1 lần (không enhance) trên dải MRZ đã cắt → nhanh
+    4. Dừng ngay khi có frame hợp lệ check digit; trường yếu (tên...) bỏ phiếu qua các frame
+    source: số thứ tự camera (0, 1...) hoặc đường dẫn / URL video
+    """
+    def __init__(self, source=0, on_result=None, timeout=30.0, min_votes=1,
+                 vote_frames=3, check_fps=10.0, motion_threshold=12.0):
+        self.source = source
+        self.on_result = on_result
+        self.timeout = timeout
+        self.min_votes = max(1, min_votes)
+        self.vote_frames = max(self.min_votes, vote_frames)
+        self.check_fps = check_fps
+        self.motion_threshold = motion_threshold
+        
+        self.result = None
+        self.stats = {'grabbed': 0, 'dropped': 0, 'checked': 0, 'ocr': 0, 'elapsed': 0.0}
+        
+        self._cap = None
+        self._latest = None
+        self._last_thumb = None
+        self._lock = threading.Lock()
+        self._new_frame = threading.Event()
+        self._grab_done = threading.Event()
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._threads = []
+    
+    def start(self):
+        """Mở nguồn video và chạy 2 thread grab / đọc"""
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            raise IOError(f"Không mở được nguồn video: {self.source}")
+        
+        # File video: phát đúng tốc độ thật để mô phỏng camera
+        self._frame_delay = 0.0
+        if isinstance(self.source, str) and os.path.exists(self.source):
+            fps = self._cap.get(cv2.CAP_PROP_FPS) or 25.0
+            self._frame_delay = 1.0 / fps
+        
+        self._started_at = time.time()
+        for target, name in ((self._grab_loop, "video-grab"), (self._read_loop, "video-read")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(2.0)
+        self._threads = []
+    
+    def wait(self, timeout=None):
+        """Đợi đến khi có kết quả / hết giờ / hết video, trả về Guest hoặc None"""
+        self._done.wait(timeout)
+        return self.result
+    
+    def is_running(self):
+        return bool(self._threads) and not self._done.is_set()
+    
+    def _grab_loop(self):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                ok, frame = self._cap.read()
+                if not ok:
+                    if self._frame_delay:
+                        break          # Hết file video
+                    time.sleep(0.01)   # Camera chưa sẵn sàng
+                    continue
+                
+                index += 1
+                with self._lock:
+                    self._latest = (index, frame)
+                self.stats['grabbed'] = index
+                self._new_frame.set()
+                
+                if self._frame_delay:
+                    time.sleep(self._frame_delay)
+        finally:
+            self._cap.release()
+            self._grab_done.set()
+    
+    def _read_loop(self):
+        voter = MRZFrameVoter()
+        last_index = 0
+        last_thumb = None
+        last_check = 0.0
+        deadline = self._started_at + self.timeout
+        
+        try:
+            while not self._stop.is_set() and time.time() < deadline:
+                if not self._new_frame.wait(0.1):
+                    if self._grab_done.is_set():
+                        break
+                    continue
+                
+                # Giới hạn số frame kiểm tra / giây
+                wait = 1.0 / self.check_fps - (time.time() - last_check)
+                if wait > 0 and self._stop.wait(wait):
+                    break
+                last_check = time.time()
+                
+                with self._lock:
+                    index, frame = self._latest
+                    self._new_frame.clear()
+                self.stats['dropped'] += max(0, index - last_index - 1)
+                last_index = index
+                
+                try:
+                    fields = self._read_frame(frame, last_thumb)
+                except Exception as e:
+                    print(f"Lỗi đọc frame: {e}")
+                    fields = None
+                last_thumb = self._last_thumb
+                if not fields:
+                    continue
+                
+                voter.add(fields)
+                result = None
+                if fields['valid'] and voter.frames >= self.min_votes:
+                    result = voter.result() or fields
+                elif voter.frames >= self.vote_frames:
+                    result = voter.result()
+                
+                if result:
+                    self.result = guest_from_mrz_fields(result, f"camera:{self.source}", 'video')
+                    break
+        except Exception as e:
+            print(f"Lỗi đọc video: {e}")
+        finally:
+            self.stats['elapsed'] = time.time() - self._started_at
+            self._stop.set()
+            self._done.set()
+            if self.result is not None and self.on_result:
+                self.on_result(self.result)
+    
+    def _read_frame(self, frame, last_thumb):
+        """Kiểm tra nhanh rồi OCR 1 frame, trả về kết quả parse hoặc None"""
+        height, width = frame.shape[:2]
+        if height > width:
+            frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+            height, width = frame.shape[:2]
+        
+        thumb = load_thumbnail(image=frame)
+        self._last_thumb = thumb
+        self.stats['checked'] += 1
+        
+        # Frame đang rung / đang đặt giấy tờ → bỏ
+        if last_thumb is not None and last_thumb.shape == thumb.shape:
+            if float(np.mean(cv2.absdiff(thumb, last_thumb))) > self.motion_threshold:
+                return None
+        
+        report = assess_image_quality(image=thumb)
+        if not report.ok:
+            return None
+        
+        # Chỉ OCR dải MRZ (+ lề) thay vì cả frame
+        scale = width / float(thumb.shape[1])
+        x, y, w, h = report.mrz_box
+        pad = 2 * h
+        top = max(0, int((y - pad) * scale))
+        bottom = min(height, int((y + h + pad) * scale))
+        crop = frame[top:bottom, :]
+        
+        self.stats['ocr'] += 1
+        mrz_obj, _ = read_mrz_obj_from_array(crop, allow_enhance=False)
+        return parse_mrz_object(mrz_obj) if mrz_obj else None
+
+# ============= SCAN SERVICE =============
+class ScanServiceHandler(BaseHTTPRequestHandler):
+    """
+    API nội bộ (chỉ localhost):
+    - POST /scan?name=<tên ảnh>&timeout=<giây>  body = bytes ảnh JPG/PNG
+    - GET  /health   trạng thái worker + hàng đợi
+    - GET  /metrics  số request, timeout, độ trễ...
+    """
+    server_version = "MRZScanService/1.0"
+    timeout = 30   # Timeout socket khi nhận request (giây)
+    
+    def do_GET(self):
+        path = urlparse(self.path).path
+        service = self.server.service
+        
+        if path == '/health':
+            self._send_json(200, service.health())
+        elif path == '/metrics':
+            self._send_json(200, service.metrics())
+        else:
+            self._send_json(404, {'ok': False, 'error': 'not found'})
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        service = self.server.service
+        
+        if url.path != '/scan':
+            self._send_json(404, {'ok': False, 'error': 'not found'})
+            return
+        
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0
+        
+        if length <= 0:
+            self._send_json(400, {'ok': False, 'error': 'empty body'})
+            return
+        if length > service.max_bytes:
+            self._send_json(413, {'ok': False, 'error': 'image too large'})
+            return
+        
+        params = parse_qs(url.query)
+        name = os.path.basename(params.get('name', ['upload.jpg'])[0]) or 'upload.jpg'
+        try:
+            timeout = float(params.get('timeout', [service.request_timeout])[0])
+        except ValueError:
+            timeout = service.request_timeout
+        timeout = max(0.1, min(timeout, service.request_timeout))
+        
+        data = self.rfile.read(length)
+        status, body = service.scan(data, name, timeout)
+        self._send_json(status, body)
+    
+    def _send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        """Tắt log mặc định của http.server"""
+        pass
+
+class ScanService:
+    """
+    DỊCH VỤ QUÉT NỘI BỘ QUA HTTP:
+    1. Nhận bytes ảnh, không ghi file tạm
+    2. Đưa vào làn interactive của ScanScheduler (dùng chung worker với GUI)
+    3. Đợi kết quả tối đa request_timeout giây, trả về JSON
+    4. Mỗi request chạy trên 1 thread riêng → nhiều request song song
+    """
+    def __init__(self, scheduler, host='127.0.0.1', port=8765,
+                 request_timeout=30.0, max_bytes=25 * 1024 * 1024):
+        self.scheduler = scheduler
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.max_bytes = max_bytes
+        self.started_at = None
+        
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'ok': 0,
+            'no_mrz': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'in_flight': 0,
+            'total_latency_ms': 0,
+            'max_latency_ms': 0,
+        }
+    
+    def start(self):
+        """Mở cổng và chạy server trên thread nền"""
+        self._server = ThreadingHTTPServer((self.host, self.port), ScanServiceHandler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self.port = self._server.server_address[1]
+        self.started_at = time.time()
+        
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="scan-service", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Đóng server"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+    
+    def scan(self, image_bytes, name, timeout):
+        """Đọc MRZ từ bytes ảnh, trả về (HTTP status, body JSON)"""
+        with self._lock:
+            self._metrics['requests'] += 1
+            self._metrics['in_flight'] += 1
+        
+        start = time.time()
+        try:
+            job = self.scheduler.submit(name, PRIORITY_INTERACTIVE, image_bytes=image_bytes)
+            
+            if not job.wait(timeout):
+                job.cancel()
+                self._count('timeouts')
+                return 504, {'ok': False, 'error': 'timeout'}
+            
+            if job.error is not None:
+                self._count('errors')
+                return 500, {'ok': False, 'error': str(job.error)}
+            
+            if job.result is None:
+                self._count('no_mrz')
+                if job.quality is not None and not job.quality.ok:
+                    return 422, {'ok': False, 'error': job.quality.message,
+                                 'reason': job.quality.reason}
+                return 422, {'ok': False, 'error': 'no MRZ found'}
+            
+            self._count('ok')
+            return 200, {'ok': True, 'result': build_result_record(job.result, job)}
+        finally:
+            latency_ms = int((time.time() - start) * 1000)
+            with self._lock:
+                self._metrics['in_flight'] -= 1
+                self._metrics['total_latency_ms'] += latency_ms
+                self._metrics['max_latency_ms'] = max(self._metrics['max_latency_ms'], latency_ms)
+    
+    def _count(self, key):
+        with self._lock:
+            self._metrics[key] += 1
+    
+    def health(self):
+        """Trạng thái cho GET /health"""
+        return {
+            'status': 'ok',
+            'workers': self.scheduler.num_workers,
+            'active': self.scheduler.active_count(),
+            'pending_interactive': self.scheduler.pending_count(PRIORITY_INTERACTIVE),
+            'pending_background': self.scheduler.pending_count(PRIORITY_BACKGROUND),
+            'uptime_s': int(time.time() - self.started_at) if self.started_at else 0,
+        }
+    
+    def metrics(self):
+        """Số liệu cho GET /metrics"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        
+        done = metrics['requests'] - metrics['in_flight']
+        metrics['avg_latency_ms'] = int(metrics['total_latency_ms'] / done) if done else 0
+        metrics.update(self.health())
+        return metrics
+
+# ============= SMILE FO SUBMITTER =============
+# Trạng thái gửi Smile FO của từng khách → nhãn hiển thị trong bảng
+PMS_STATUS_LABELS = {
+    '': '',
+    'queued': '⏳ Chờ gửi',
+    'sending': '🔄 Đang gửi',
+    'retrying': '🔁 Thử lại',
+    'sent': '✅ Đã gửi',
+    'failed': '❌ Lỗi',
+}
+
+class PMSError(Exception):
+    """Lỗi khi gửi sang PMS (retryable = có thể thử lại)"""
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class SmileFOClient:
+    """HTTP client gửi JSON sang PMS, giữ kết nối keep-alive (1 connection / thread)"""
+    def __init__(self, url, api_key='', timeout=10.0):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise ValueError(f"URL PMS không hợp lệ: {url}")
+        
+        self.url = url
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path or '/'
+        if parsed.query:
+            self.path += '?' + parsed.query
+        self.api_key = api_key
+        self.timeout = timeout
+        
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+    
+    def _connection(self):
+        """Lấy connection của thread hiện tại (tạo mới nếu chưa có)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = conn_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def post_json(self, payload):
+        """POST payload, trả về JSON response (dict) hoặc raise PMSError"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'Connection': 'keep-alive',
+        }
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        
+        conn = self._connection()
+        try:
+            conn.request('POST', self.path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            # Kết nối hỏng (server đóng keep-alive, mất mạng...) → mở lại lần sau
+            self._drop_connection()
+            raise PMSError(f"Lỗi kết nối: {e}")
+        
+        if response.will_close:
+            self._drop_connection()
+        
+        if response.status == 429 or response.status >= 500:
+            raise PMSError(f"HTTP {response.status}")
+        if response.status >= 400:
+            raise PMSError(f"HTTP {response.status}: {data[:200].decode('utf-8', 'replace')}",
+                           retryable=False)
+        
+        try:
+            return json.loads(data) if data else {}
+        except ValueError:
+            return {}
+    
+    def close(self):
+        """Đóng tất cả connection"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+class SmileFOSubmitter:
+    """
+    HÀNG ĐỢI GỬI KHÁCH SANG SMILE FO (KHÔNG CHẶN GIAO DIỆN):
+    1. submit() chỉ đưa khách vào hàng đợi, trả về ngay
+    2. Khách gửi cùng lúc được gom thành lô (≤ batch_size) → 1 request / lô
+    3. Lỗi mạng / 5xx / 429 → thử lại với backoff tăng dần (1s, 2s, 4s... + jitter)
+    4. Mỗi thay đổi trạng thái gọi on_status(guest, status, message)
+    """
+    def __init__(self, client, on_status=None, batch_size=10, max_retries=3,
+                 backoff=1.0, num_workers=2):
+        self.client = client
+        self.on_status = on_status
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        for i in range(max(1, num_workers)):
+            worker = threading.Thread(target=self._worker_loop,
+                                      name=f"smile-fo-{i}", daemon=True)
+            worker.start()
+            self._threads.append(worker)
+    
+    def submit(self, guests):
+        """Đưa danh sách khách vào hàng đợi, trả về số khách được nhận"""
+        guests = [g for g in guests if g.pms_status not in ('queued', 'sending', 'retrying')]
+        
+        for start in range(0, len(guests), self.batch_size):
+            batch = guests[start:start + self.batch_size]
+            for guest in batch:
+                self._set_status(guest, 'queued')
+            self._queue.put(batch)
+        
+        return len(guests)
+    
+    def pending_count(self):
+        return self._queue.qsize()
+    
+    def stop(self, timeout=2.0):
+        """Dừng worker (các lô chưa gửi bị bỏ)"""
+        self._stop.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for worker in self._threads:
+            worker.join(timeout)
+        self._threads = []
+        self.client.close()
+    
+    def _set_status(self, guest, status, message=''):
+        guest.pms_status = status
+        if self.on_status:
+            try:
+                self.on_status(guest, status, message)
+            except Exception as e:
+                print(f"Lỗi cập nhật trạng thái: {e}")
+    
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            batch = self._queue.get()
+            if batch is None:
+                return
+            self._send_batch(batch)
+    
+    def _send_batch(self, batch):
+        """Gửi 1 lô, thử lại nếu lỗi tạm thời"""
+        payload = {
+            'count': len(batch),
+            'guests': [guest.to_dict() for guest in batch],
+        }
+        
+        attempt = 0
+        while True:
+            for guest in batch:
+                self._set_status(guest, 'sending' if attempt == 0 else 'retrying')
+            try:
+                response = self.client.post_json(payload)
+                break
+            except PMSError as e:
+                attempt += 1
+                if not e.retryable or attempt > self.max_retries or self._stop.is_set():
+                    for guest in batch:
+                        self._set_status(guest, 'failed', str(e))
+                    return
+                
+                delay = self.backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+                if self._stop.wait(delay):
+                    for guest in batch:
+                        self._set_status(guest, 'failed', "Đã dừng")
+                    return
+        
+        # PMS có thể trả kết quả từng khách: {"results": [{"ok": true}, ...]}
+        results = response.get('results') if isinstance(response, dict) else None
+        for i, guest in enumerate(batch):
+            result = results[i] if isinstance(results, list) and i < len(results) else {}
+            if isinstance(result, dict) and result.get('ok') is False:
+                self._set_status(guest, 'failed', str(result.get('error', '')))
+            else:
+                self._set_status(guest, 'sent')
+
+def create_smile_submitter(config, on_status=None):
+    """Tạo submitter theo config (pms_url rỗng = chưa cấu hình)"""
+    url = config.get('pms_url')
+    if not url:
+        return None
+    
+    client = SmileFOClient(url,
+                           api_key=config.get('pms_api_key', ''),
+                           timeout=float(config.get('pms_timeout', 10)))
+    return SmileFOSubmitter(client, on_status=on_status,
+                            batch_size=int(config.get('pms_batch_size', 10)),
+                            max_retries=int(config.get('pms_max_retries', 3)))
+
+# ============= PREVIEW CACHE =============
+PREVIEW_SIZE = (330, 230)   # Kích thước khung xem trước (px)
+
+def make_preview(image_path, size=PREVIEW_SIZE):
+    """
+    Tạo ảnh xem trước có khung MRZ:
+    1. JPEG được giải mã thẳng ở độ phân giải thấp (draft) → nhanh với ảnh scan 20 MB
+    2. Xoay ngang nếu ảnh dọc (giống khi đọc MRZ)
+    3. Tìm vùng MRZ trên ảnh rộng QUALITY_THUMB_WIDTH, vẽ khung lên ảnh nhỏ
+    """
+    with Image.open(image_path) as img:
+        img.draft('RGB', (QUALITY_THUMB_WIDTH, QUALITY_THUMB_WIDTH))
+        img = img.convert('RGB')
+    
+    if img.height > img.width:
+        img = img.transpose(Image.Transpose.ROTATE_270)
+    
+    # Tìm MRZ ở chiều rộng cố định (các kernel được chỉnh cho ~600px)
+    scale = QUALITY_THUMB_WIDTH / float(img.width)
+    work = img.resize((QUALITY_THUMB_WIDTH, max(1, int(img.height * scale))), Image.Resampling.BILINEAR)
+    box = locate_mrz_band(np.asarray(work.convert('L')))
+    
+    img.thumbnail(size, Image.Resampling.BILINEAR)
+    
+    if box is not None:
+        ratio = img.width / float(QUALITY_THUMB_WIDTH)
+        x, y, w, h = (int(v * ratio) for v in box)
+        ImageDraw.Draw(img).rectangle([x - 2, y - 2, x + w + 2, y + h + 2], outline=(46, 204, 113), width=2)
+    
+    return img
+
+class ThumbnailCache:
+    """LRU cache ảnh xem trước, giới hạn theo tổng dung lượng pixel (bytes)"""
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+    
+    def get(self, key):
+        with self._lock:
+            image = self._items.get(key)
+            if image is not None:
+                self._items.move_to_end(key)
+            return image
+    
+    def put(self, key, image):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= self._image_bytes(old)
+            
+            self._items[key] = image
+            self._size += self._image_bytes(image)
+            
+            # Bỏ ảnh ít dùng nhất cho đến khi đủ chỗ
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= self._image_bytes(evicted)
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+    
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._items), 'bytes': self._size}
+
+class PreviewLoader:
+    """
+    Tạo ảnh xem trước trên thread nền:
+    - Yêu cầu mới thay thế yêu cầu cũ chưa chạy (lướt nhanh bằng phím mũi tên không bị dồn việc)
+    - Tải trước ảnh của khách liền trước / liền sau
+    - on_ready(path, image) được gọi khi xong (image = None nếu lỗi)
+    """
+    def __init__(self, cache, on_ready, size=PREVIEW_SIZE):
+        self.cache = cache
+        self.on_ready = on_ready
+        self.size = size
+        
+        self._requests = deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="preview-loader", daemon=True)
+        self._thread.start()
+    
+    def request(self, path, prefetch=()):
+        """Yêu cầu ảnh path (ưu tiên) và tải trước các ảnh prefetch"""
+        with self._cond:
+            self._requests.clear()
+            for p in (path,) + tuple(prefetch):
+                if p and self.cache.get(p) is None:
+                    self._requests.append(p)
+            self._cond.notify()
+    
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._requests.clear()
+            self._cond.notify()
+        self._thread.join(2.0)
+    
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._requests:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                path = self._requests.popleft()
+            
+            image = self.cache.get(path)
+            if image is None:
+                try:
+                    image = make_preview(path, self.size)
+                    self.cache.put(path, image)
+                except Exception as e:
+                    print(f"Lỗi tạo preview: {e}")
+                    image = None
+            
+            self.on_ready(path, image)
+
+# ============= SCAN PIPELINE =============
+class ScanPipeline:
+    """
+    LUỒNG QUÉT KHÔNG PHỤ THUỘC GIAO DIỆN:
+    1. process_images() đưa ảnh vào ScanScheduler theo làn ưu tiên
+    2. process_scan_job() chạy trên worker: quality gate → đọc MRZ → add_guest() → result sink
+    3. Giao diện (MRZReaderApp) chỉ ghi đè các hook: log, add_guest,
+       update_processing_status, on_scan_idle
+    Chạy được không cần Tk (VD: soak_watch.py)
+    """
+    def __init__(self, config, num_workers=DEFAULT_SCAN_WORKERS):
+        self.config = config
+        self.guests = []
+        
+        # Bộ lập lịch: kéo thả được ưu tiên hơn backlog thư mục
+        self.scheduler = ScanScheduler(self.process_scan_job, num_workers=num_workers,
+                                       on_idle=self.on_scan_idle)
+        self.scheduler.start()
+        
+        # Ghi kết quả ra file JSONL/CSV (append-only, theo lô)
+        self.result_sink = None
+        try:
+            self.result_sink = create_result_sink(config)
+        except Exception as e:
+            print(f"Lỗi tạo result sink: {e}")
+    
+    def process_images(self, image_files, priority=PRIORITY_BACKGROUND):
+        """Đưa nhiều ảnh vào hàng đợi của scheduler"""
+        for image_path in image_files:
+            self.scheduler.submit(image_path, priority)
+        
+        self.update_processing_status()
+    
+    def process_scan_job(self, job):
+        """Đọc MRZ cho 1 ảnh (chạy trên worker của scheduler), trả về Guest"""
+        image_path = job.image_path
+        name = os.path.basename(image_path)
+        guest = None
+        try:
+            self.log(f"📸 Đọc: {name}")
+            
+            # Kiểm tra nhanh chất lượng ảnh → báo quét lại ngay nếu ảnh hỏng
+            gate = self.config.get('quality_gate', 'flag')
+            if gate != 'off':
+                job.quality = assess_image_quality(image_path if job.image_bytes is None else None,
+                                                   job.image_bytes)
+                if not job.quality.ok:
+                    if gate == 'reject':
+                        self.log(f"⚠️ {name}: {job.quality.message} - vui lòng quét lại")
+                        self.update_processing_status()
+                        return None
+                    self.log(f"⚠️ {name}: {job.quality.message} (vẫn thử đọc 1 lần, bỏ qua lần enhance)")
+            
+            guest = self.read_image(job)
+            elapsed = time.time() - job.submitted_at
+            
+            if guest:
+                if job.image_bytes is None:
+                    guest.source_path = image_path
+                self.add_guest(guest)
+                if self.result_sink:
+                    self.result_sink.write(build_result_record(guest, job))
+                self.log(f"✅ {guest.full_name} - {guest.passport_number} ({elapsed:.1f}s)")
+            else:
+                self.log(f"❌ Không đọc được MRZ: {name}")
+        
+        except Exception as e:
+            self.log(f"❌ Lỗi: {e}")
+        
+        self.update_processing_status()
+        return guest
+    
+    def read_image(self, job):
+        """
+        Đọc MRZ của 1 job (file hoặc bytes trong bộ nhớ), trả về Guest hoặc None.
+        Ảnh trượt quality gate (chế độ flag) chỉ đọc 1 lần, không enhance
+        """
+        allow_enhance = job.quality is None or job.quality.ok
+        if job.image_bytes is not None:
+            return read_mrz_from_bytes(job.image_bytes, os.path.basename(job.image_path), allow_enhance)
+        return read_mrz_from_image(job.image_path, allow_enhance)
+    
+    def add_guest(self, guest):
+        """Lưu guest đọc được (giao diện ghi đè để hiện lên bảng)"""
+        self.guests.append(guest)
+    
+    def update_processing_status(self):
+        """Cập nhật trạng thái hàng đợi (giao diện ghi đè)"""
+        pass
+    
+    def on_scan_idle(self):
+        """Khi scheduler xử lý hết hàng đợi (giao diện ghi đè)"""
+        pass
+    
+    def log(self, message):
+        """Ghi log (giao diện ghi đè để hiện lên panel Log)"""
+        print(message)
+    
+    def shutdown(self):
+        """Dừng scheduler và ghi nốt kết quả xuống disk"""
+        self.scheduler.stop()
+        if self.result_sink:
+            self.result_sink.close()
+
 # ============= GUI APPLICATION =============
-class MRZReaderApp:
+class MRZReaderApp(ScanPipeline):
     def __init__(self, root):
         self.root = root
         self.root.title("🧩 MRZ Reader - Drag & Drop + Folder Watcher")
         self.root.geometry("1400x850")
         
-        self.guests = []
-        self.processing = False
+        self.guest_items = {}   # Guest → id dòng trong Treeview
+        
+        # API quét qua HTTP cho PMS / kiosk (tắt mặc định)
+        self.scan_service = None
         
         # Folder watcher
         self.watch_folder = ""
         self.process_folder = ""
-        self.observer = None
+        self.folder_watcher = None
         self.watching = False
         
+        # Chế độ đọc bằng camera
+        self.video_capture = None
+        
+        # Xem trước ảnh gốc (cache LRU theo dung lượng)
+        self.preview_path = ''
+        self.preview_cache = None
+        self.preview_loader = None
+        
         # Load config
         self.load_saved_config()
         
+        # Scheduler + result sink
+        super().__init__(self.config)
+        
+        self.preview_cache = ThumbnailCache(int(float(self.config.get('preview_cache_mb', 32)) * 1024 * 1024))
+        self.preview_loader = PreviewLoader(self.preview_cache, self.on_preview_ready)
+        
+        # Hàng đợi gửi khách sang Smile FO
+        self.smile_submitter = None
+        try:
+            self.smile_submitter = create_smile_submitter(self.config, self.on_pms_status)
+        except Exception as e:
+            print(f"Lỗi tạo Smile FO submitter: {e}")
+        
         self.setup_ui()
         
         # Auto-start watching nếu có config
@@ -427,6 +2841,7 @@ class MRZReaderApp:
     def load_saved_config(self):
         """Load config đã lưu"""
         config = ConfigManager.load_config()
+        self.config = config
         self.watch_folder = config.get('watch_folder', '')
         self.process_folder = config.get('process_folder', '')
     
@@ -504,6 +2919,12 @@ class MRZReaderApp:
                                          font=("Arial", 10, "bold"), height=1, width=18)
         self.scan_folder_btn.pack(side=tk.LEFT, padx=5)
         
+        self.camera_btn = tk.Button(row3, text="📷 CAMERA", 
+                                    command=self.toggle_camera,
+                                    bg="#e67e22", fg="white", 
+                                    font=("Arial", 10, "bold"), height=1, width=18)
+        self.camera_btn.pack(side=tk.LEFT, padx=5)
+        
         # Main container
         main = tk.Frame(self.root)
         main.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -533,7 +2954,7 @@ class MRZReaderApp:
         tk.Label(left_frame, text="📋 DANH SÁCH KHÁCH", 
                 font=("Arial", 12, "bold")).pack(pady=5)
         
-        columns = ("Name", "Passport", "DOB", "Gender", "Issuing", "Nationality")
+        columns = ("Name", "Passport", "DOB", "Gender", "Issuing", "Nationality", "Smile")
         self.tree = ttk.Treeview(left_frame, columns=columns, show="tree headings", height=18)
         
         self.tree.heading("#0", text="STT")
@@ -543,6 +2964,7 @@ class MRZReaderApp:
         self.tree.heading("Gender", text="GT")
         self.tree.heading("Issuing", text="Quốc gia cấp")
         self.tree.heading("Nationality", text="Quốc tịch")
+        self.tree.heading("Smile", text="Smile FO")
         
         self.tree.column("#0", width=40)
         self.tree.column("Name", width=220)
@@ -551,6 +2973,7 @@ class MRZReaderApp:
         self.tree.column("Gender", width=50)
         self.tree.column("Issuing", width=100)
         self.tree.column("Nationality", width=100)
+        self.tree.column("Smile", width=100)
         
         scrollbar = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.tree.yview)
         self.tree.configure(yscroll=scrollbar.set)
@@ -594,6 +3017,20 @@ class MRZReaderApp:
                                    font=("Arial", 11, "bold"), height=2)
         self.clear_btn.pack(fill=tk.X, pady=5)
         
+        # Preview ảnh gốc (có khung MRZ)
+        preview_frame = tk.LabelFrame(right_frame, text="🖼️ Ảnh gốc", 
+                                      font=("Arial", 10, "bold"))
+        preview_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        # Khung cố định kích thước (px) để giao diện không nhảy khi đổi ảnh
+        preview_box = tk.Frame(preview_frame, width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1])
+        preview_box.pack(padx=5, pady=5)
+        preview_box.pack_propagate(False)
+        
+        self.preview_label = tk.Label(preview_box, text="Chọn khách để xem ảnh",
+                                      font=("Arial", 9), fg="#7f8c8d")
+        self.preview_label.pack(fill=tk.BOTH, expand=True)
+        
         # Selected guest info
         info_frame = tk.LabelFrame(right_frame, text="ℹ️ Thông tin chi tiết", 
                                    font=("Arial", 10, "bold"))
@@ -622,16 +3059,29 @@ class MRZReaderApp:
         
         self.log("✅ Sẵn sàng nhận ảnh")
         self.log("💡 Kéo thả ảnh passport vào khung phía trên")
+        if self.result_sink:
+            self.log(f"💾 Kết quả được ghi vào: {self.result_sink.current_path()}")
+        
+        if self.config.get('service_enabled'):
+            self.start_scan_service()
+    
+    def start_scan_service(self):
+        """Bật API quét qua HTTP (localhost)"""
+        try:
+            self.scan_service = ScanService(self.scheduler,
+                                            host=self.config.get('service_host', '127.0.0.1'),
+                                            port=int(self.config.get('service_port', 8765)))
+            self.scan_service.start()
+            self.log(f"🌐 API quét: {self.scan_service.url()}/scan")
+        except Exception as e:
+            self.scan_service = None
+            self.log(f"❌ Không mở được API quét: {e}")
     
     def on_drop(self, event):
-        """Xử lý khi kéo thả file"""
-        if self.processing:
-            self.log("⚠️ Đang xử lý, vui lòng đợi...")
-            return
-        
+        """Xử lý khi kéo thả file - ưu tiên cao, không phải đợi backlog"""
         # Parse file paths
         files = self.root.tk.splitlist(event.data)
-        image_files = [f for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+        image_files = [f for f in files if f.lower().endswith(IMAGE_EXTENSIONS)]
         
         if not image_files:
             self.log("❌ Không có file ảnh hợp lệ")
@@ -639,30 +3089,16 @@ class MRZReaderApp:
         
         self.log(f"📥 Nhận {len(image_files)} ảnh")
         
-        # Process in thread
-        threading.Thread(target=self.process_images, args=(image_files,), daemon=True).start()
+        self.process_images(image_files, priority=PRIORITY_INTERACTIVE)
     
-    def process_images(self, image_files):
-        """Xử lý nhiều ảnh"""
-        self.processing = True
-        self.status_label.config(text="⏳ Đang xử lý...", fg="orange")
-        
-        for image_path in image_files:
-            try:
-                self.log(f"📸 Đọc: {os.path.basename(image_path)}")
-                
-                guest = read_mrz_from_image(image_path)
-                
-                if guest:
-                    self.add_guest(guest)
-                    self.log(f"✅ {guest.full_name} - {guest.passport_number}")
-                else:
-                    self.log(f"❌ Không đọc được MRZ: {os.path.basename(image_path)}")
-            
-            except Exception as e:
-                self.log(f"❌ Lỗi: {e}")
-        
-        self.processing = False
+    def update_processing_status(self):
+        """Cập nhật trạng thái theo số ảnh còn trong hàng đợi"""
+        pending = self.scheduler.pending_count()
+        if pending or self.scheduler.active_count():
+            self.status_label.config(text=f"⏳ Đang xử lý... (chờ: {pending})", fg="orange")
+    
+    def on_scan_idle(self):
+        """Khi scheduler xử lý hết hàng đợi"""
         self.status_label.config(text="✅ Hoàn thành", fg="green")
         self.log("🎉 Xử lý xong!")
     
@@ -671,21 +3107,23 @@ class MRZReaderApp:
         self.guests.append(guest)
         
         index = len(self.guests)
-        self.tree.insert("", tk.END, text=str(index),
-                        values=(guest.full_name, 
-                               guest.passport_number,
-                               guest.dob,
-                               guest.gender,
-                               guest.issuing_country,
-                               guest.nationality))
+        item_id = self.tree.insert("", tk.END, text=str(index),
+                                   values=(guest.full_name, 
+                                          guest.passport_number,
+                                          guest.dob,
+                                          guest.gender,
+                                          guest.issuing_country,
+                                          guest.nationality,
+                                          PMS_STATUS_LABELS.get(guest.pms_status, '')))
+        self.guest_items[guest] = item_id
         
         self.count_label.config(text=f"Tổng: {len(self.guests)} khách")
+        self.fill_btn.config(state=tk.NORMAL)
     
     def on_guest_select(self, event):
         """Khi chọn guest - BỎ expiry_date"""
         selection = self.tree.selection()
         if not selection:
-            self.fill_btn.config(state=tk.DISABLED)
             return
         
         item = self.tree.item(selection[0])
@@ -707,6 +3145,7 @@ class MRZReaderApp:
 🏴 Quốc tịch: {guest.nationality}
 📸 File: {guest.source_image}
 🕒 Quét lúc: {guest.scan_time}
+📝 Smile FO: {PMS_STATUS_LABELS.get(guest.pms_status, '') or 'Chưa gửi'}
             """
             
             self.info_text.config(state=tk.NORMAL)
@@ -714,7 +3153,48 @@ class MRZReaderApp:
             self.info_text.insert(1.0, info)
             self.info_text.config(state=tk.DISABLED)
             
-            self.fill_btn.config(state=tk.NORMAL)
+            self.show_guest_preview(index)
+    
+    def show_guest_preview(self, index):
+        """Hiện ảnh gốc của khách (lấy từ cache hoặc tạo trên thread nền)"""
+        path = self.guests[index].source_path
+        self.preview_path = path
+        
+        if not path:
+            self.set_preview_text("Không có ảnh gốc")
+            return
+        
+        image = self.preview_cache.get(path)
+        if image is not None:
+            self.display_preview(path, image)
+        else:
+            self.set_preview_text("⏳ Đang tải ảnh...")
+        
+        # Tải trước ảnh khách liền trước / liền sau → lướt bằng phím mũi tên tức thì
+        neighbors = tuple(self.guests[i].source_path for i in (index + 1, index - 1)
+                          if 0 <= i < len(self.guests))
+        self.preview_loader.request(path, neighbors)
+    
+    def on_preview_ready(self, path, image):
+        """Thread preview tạo xong ảnh → hiển thị trên thread giao diện"""
+        if path == self.preview_path:
+            self.root.after(0, self.display_preview, path, image)
+    
+    def display_preview(self, path, image):
+        """Hiển thị ảnh xem trước (chỉ khi vẫn đang chọn khách đó)"""
+        if path != self.preview_path:
+            return
+        if image is None:
+            self.set_preview_text("❌ Không mở được ảnh gốc")
+            return
+        
+        photo = ImageTk.PhotoImage(image)
+        self.preview_label.config(image=photo, text="")
+        self.preview_label.image = photo   # Giữ tham chiếu, tránh bị thu hồi
+    
+    def set_preview_text(self, text):
+        self.preview_label.config(image="", text=text)
+        self.preview_label.image = None
     
     def show_context_menu(self, event):
         """Right-click menu"""
@@ -751,6 +3231,7 @@ class MRZReaderApp:
                 "#4": item['values'][3] if len(item['values']) > 3 else "",  # Gender
                 "#5": item['values'][4] if len(item['values']) > 4 else "",  # Issuing
                 "#6": item['values'][5] if len(item['values']) > 5 else "",  # Nationality
+                "#7": item['values'][6] if len(item['values']) > 6 else "",  # Smile FO
             }
             
             text_to_copy = str(col_map.get(column, ""))
@@ -786,20 +3267,45 @@ class MRZReaderApp:
             self.log(f"❌ Lỗi copy: {e}")
     
     def fill_to_smile(self):
-        """Điền vào Smile FO"""
-        selection = self.tree.selection()
-        if not selection:
+        """Gửi khách đã chọn (hoặc tất cả) sang Smile FO - chạy nền"""
+        if not self.smile_submitter:
+            messagebox.showwarning("Cảnh báo",
+                                   "Chưa cấu hình Smile FO!\n"
+                                   f"Điền 'pms_url' trong {CONFIG_FILE}")
             return
         
-        item = self.tree.item(selection[0])
-        index = int(item['text']) - 1
-        guest = self.guests[index]
+        guests = []
+        for item_id in self.tree.selection():
+            index = int(self.tree.item(item_id)['text']) - 1
+            if 0 <= index < len(self.guests):
+                guests.append(self.guests[index])
+        
+        if not guests:
+            if not self.guests:
+                return
+            if not messagebox.askyesno("Xác nhận", f"Gửi tất cả {len(self.guests)} khách sang Smile FO?"):
+                return
+            guests = [g for g in self.guests if g.pms_status != 'sent']
+        
+        count = self.smile_submitter.submit(guests)
+        self.log(f"🔄 Đưa {count} khách vào hàng đợi Smile FO")
+    
+    def on_pms_status(self, guest, status, message=''):
+        """Thread gửi Smile FO báo trạng thái → cập nhật trên thread giao diện (không chờ Tk)"""
+        self.root.after(0, self.show_pms_status, guest, status, message)
+    
+    def show_pms_status(self, guest, status, message=''):
+        """Cập nhật trạng thái Smile FO của 1 khách trên bảng + log"""
+        item_id = self.guest_items.get(guest)
+        if item_id is None or not self.tree.exists(item_id):
+            return
         
-        messagebox.showinfo("Thông báo", 
-                           f"Chức năng điền vào Smile FO\n"
-                           f"Khách: {guest.full_name}\n"
-                           f"(Sẽ được implement sau)")
-        self.log(f"🔄 {guest.full_name} → Smile FO (TODO)")
+        self.tree.set(item_id, "Smile", PMS_STATUS_LABELS.get(status, status))
+        
+        if status == 'sent':
+            self.log(f"✅ Smile FO: {guest.full_name}")
+        elif status == 'failed':
+            self.log(f"❌ Smile FO: {guest.full_name} - {message}")
     
     def clear_all(self):
         """Xóa tất cả"""
@@ -808,13 +3314,19 @@ class MRZReaderApp:
         
         if messagebox.askyesno("Xác nhận", "Xóa tất cả khách đã quét?"):
             self.guests.clear()
+            self.guest_items.clear()
             self.tree.delete(*self.tree.get_children())
             self.count_label.config(text="Tổng: 0 khách")
             self.info_text.config(state=tk.NORMAL)
             self.info_text.delete(1.0, tk.END)
             self.info_text.config(state=tk.DISABLED)
             self.fill_btn.config(state=tk.DISABLED)
+            self.preview_path = ''
+            self.preview_cache.clear()
+            self.set_preview_text("Chọn khách để xem ảnh")
             self.log("🗑️ Đã xóa tất cả")
+            if self.result_sink:
+                self.log("💾 Kết quả đã quét vẫn được lưu trong file kết quả")
     
     def select_watch_folder(self):
         """Chọn thư mục lắng nghe"""
@@ -845,17 +3357,21 @@ class MRZReaderApp:
             return
         
         try:
-            event_handler = ImageFolderHandler(self)
-            self.observer = Observer()
-            self.observer.schedule(event_handler, self.watch_folder, recursive=False)
-            self.observer.start()
+            folders = [f for f in normalize_watch_folders(self.config, self.watch_folder)
+                       if os.path.isdir(f['path'])]
+            
+            self.folder_watcher = FolderWatcher(ImageFolderHandler(self))
+            started = self.folder_watcher.start(folders)
             
             self.watching = True
-            self.watch_status_label.config(text="✅ Đang quét...", fg="#2ecc71")
+            self.watch_status_label.config(text=f"✅ Đang quét ({len(started)} thư mục)...", fg="#2ecc71")
             self.start_watch_btn.config(state=tk.DISABLED)
             self.stop_watch_btn.config(state=tk.NORMAL)
             
-            self.log(f"👁️ Bắt đầu lắng nghe: {self.watch_folder}")
+            for folder, mode in started:
+                kind = "polling" if mode == 'poll' else "event"
+                recursive = ", cả thư mục con" if folder['recursive'] else ""
+                self.log(f"👁️ Bắt đầu lắng nghe: {folder['path']} ({kind}{recursive})")
             self.log(f"💾 File đã xử lý sẽ chuyển đến: {self.process_folder}")
             
         except Exception as e:
@@ -864,10 +3380,9 @@ class MRZReaderApp:
     
     def stop_watching(self):
         """Dừng lắng nghe thư mục"""
-        if self.observer:
-            self.observer.stop()
-            self.observer.join()
-            self.observer = None
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
         
         self.watching = False
         self.watch_status_label.config(text="⏸️ Đã dừng", fg="#95a5a6")
@@ -884,27 +3399,85 @@ class MRZReaderApp:
         
         try:
             image_files = []
-            for filename in os.listdir(self.watch_folder):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    if '_rotated' not in filename and '_enhanced' not in filename:
-                        image_files.append(os.path.join(self.watch_folder, filename))
+            for folder in normalize_watch_folders(self.config, self.watch_folder):
+                image_files.extend(iter_scan_images(folder['path'], folder['recursive']))
             
             if image_files:
                 self.log(f"🔍 Tìm thấy {len(image_files)} ảnh trong thư mục")
-                threading.Thread(target=self.process_images, args=(image_files,), daemon=True).start()
+                self.process_images(image_files, priority=PRIORITY_BACKGROUND)
             else:
                 self.log("⚠️ Không tìm thấy ảnh trong thư mục")
         except Exception as e:
             self.log(f"❌ Lỗi quét thư mục: {e}")
     
+    def toggle_camera(self):
+        """Bật / tắt đọc MRZ bằng camera"""
+        if self.video_capture and self.video_capture.is_running():
+            self.video_capture.stop()
+            self.log("⏹️ Đã dừng camera")
+            return
+        
+        source = self.config.get('camera_source', 0)
+        try:
+            self.video_capture = VideoMRZCapture(source, on_result=self.on_camera_result,
+                                                 timeout=float(self.config.get('camera_timeout', 30)))
+            self.video_capture.start()
+        except Exception as e:
+            self.video_capture = None
+            self.log(f"❌ Lỗi camera: {e}")
+            return
+        
+        self.camera_btn.config(text="⏹️ DỪNG CAMERA")
+        self.log(f"📷 Đưa hộ chiếu vào camera ({source})...")
+        threading.Thread(target=self.wait_camera, args=(self.video_capture,), daemon=True).start()
+    
+    def wait_camera(self, capture):
+        """Đợi camera đọc xong (chạy nền) → cập nhật nút và log trên thread giao diện"""
+        capture.wait()
+        self.root.after(0, self.on_camera_done, capture)
+    
+    def on_camera_done(self, capture):
+        """Camera dừng: trả lại nút, log thống kê"""
+        self.camera_btn.config(text="📷 CAMERA")
+        
+        stats = capture.stats
+        if capture.result is None:
+            self.log(f"⚠️ Camera: chưa đọc được MRZ sau {stats['elapsed']:.1f}s")
+        self.log(f"📊 Camera: {stats['checked']} frame kiểm tra, {stats['ocr']} lần OCR, "
+                 f"bỏ {stats['dropped']} frame")
+    
+    def on_camera_result(self, guest):
+        """Khi camera đọc được MRZ hợp lệ (gọi từ thread đọc camera)"""
+        if self.result_sink:
+            self.result_sink.write(build_result_record(guest))
+        elapsed = self.video_capture.stats['elapsed'] if self.video_capture else 0
+        self.root.after(0, self.show_camera_result, guest, elapsed)
+    
+    def show_camera_result(self, guest, elapsed):
+        """Thêm khách đọc từ camera lên bảng (thread giao diện)"""
+        self.add_guest(guest)
+        self.log(f"✅ {guest.full_name} - {guest.passport_number} (camera, {elapsed:.1f}s)")
+    
     def on_closing(self):
         """Xử lý khi đóng app"""
         if self.watching:
-            if messagebox.askyesno("Xác nhận", "Đang lắng nghe thư mục. Bạn có muốn dừng và thoát?"):
-                self.stop_watching()
-                self.root.destroy()
-        else:
-            self.root.destroy()
+            if not messagebox.askyesno("Xác nhận", "Đang lắng nghe thư mục. Bạn có muốn dừng và thoát?"):
+                return
+            self.stop_watching()
+        
+        self.shutdown()
+        self.root.destroy()
+    
+    def shutdown(self):
+        """Dừng camera, preview, API, Smile FO rồi scheduler + result sink"""
+        if self.video_capture:
+            self.video_capture.stop()
+        self.preview_loader.stop()
+        if self.scan_service:
+            self.scan_service.stop()
+        if self.smile_submitter:
+            self.smile_submitter.stop()
+        super().shutdown()
     
     def log(self, message):
         """Ghi log"""
@@ -0,0 +1,571 @@
+"""
+Soak / burst test cho luồng lắng nghe thư mục - chạy không cần giao diện
+
+Mô phỏng máy scan ghi ảnh vào 1 thư mục tạm và chạy đúng luồng của app:
+FolderWatcher → ImageFolderHandler → ScanPipeline
+(ScanScheduler → quality gate → đọc MRZ → add_guest → result sink)
+
+Các kiểu ghi file:
+- normal:       ghi 1 lần
+- slow:         ghi từng phần trong vài giây (máy scan / ổ mạng chậm)
+- rename:       ghi file .tmp rồi đổi tên thành .jpg
+- image_rename: ghi scan_xxx_tmp.jpg rồi đổi tên thành scan_xxx.jpg (ảnh → ảnh, trước khi ảnh kịp "đứng yên")
+- duplicate:    ghi đè lại cùng file sau khi ghi xong (máy scan lưu 2 lần)
+
+Đo và xuất báo cáo:
+- Độ trễ từ lúc tạo file → có kết quả (p50 / p95 / p99 / max)
+- Ảnh bị bỏ sót, bị đọc trùng (thêm khách 2 lần), bị đọc khi chưa ghi xong
+- Số record trong result sink so với số khách đọc được
+- Số thread, RSS theo thời gian và tốc độ tăng RSS (MB/giờ)
+
+Ví dụ:
+    python soak_watch.py --duration 300
+    python soak_watch.py --duration 28800 --mode poll --report soak_report.json
+    python soak_watch.py --reader real --sample passport.jpg --duration 3600
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import deque
+
+import cv2
+import numpy as np
+
+import gui_app_copy as mrz
+
+# MRZ mẫu ICAO 9303 dùng cho ảnh giả lập / reader 'fake'
+SAMPLE_MRZ = ("P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<",
+              "L898902C36UTO7408122F1204159ZE184226B<<<<<10")
+
+def synthetic_scan():
+    """Ảnh passport giả (JPEG) có dải MRZ - đủ để quality gate chạy như với ảnh thật"""
+    img = np.full((1700, 2400, 3), 235, np.uint8)
+    cv2.rectangle(img, (150, 300), (650, 950), (120, 110, 100), -1)
+    for i, line in enumerate(SAMPLE_MRZ):
+        cv2.putText(img, line, (110, 1400 + i * 72), cv2.FONT_HERSHEY_SIMPLEX, 1.95, (20, 20, 20), 4)
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+# ============= MEMORY =============
+def read_rss_mb():
+    """RSS hiện tại của process (MB), None nếu không đo được"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    if os.name == 'nt':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            kernel32 = ctypes.windll.kernel32
+            psapi = ctypes.windll.psapi
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE,
+                                                   ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+                                                   wintypes.DWORD]
+            if psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(),
+                                          ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize / (1024 * 1024)
+        except Exception:
+            pass
+        return None
+
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def pipeline_thread_count():
+    """Số thread của app (không tính thread ghi file của harness)"""
+    return sum(1 for t in threading.enumerate() if not t.name.startswith('soak-'))
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def slope_per_hour(points):
+    """Hệ số góc (đơn vị / giờ) của chuỗi (giây, giá trị) theo bình phương tối thiểu"""
+    points = [(t, v) for t, v in points if v is not None]
+    if len(points) < 2:
+        return None
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t == 0:
+        return None
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var_t * 3600
+
+# ============= PIPELINE =============
+class SoakPipeline(mrz.ScanPipeline):
+    """
+    ScanPipeline thật của app (quality gate, add_guest, result sink), chỉ thêm:
+    - Ghi lại kết quả từng job để đo
+    - Reader 'fake': giả lập thời gian OCR thay cho PassportEye
+    """
+    def __init__(self, harness, config, workers):
+        self.harness = harness
+        self.log_lines = 0
+        super().__init__(config, num_workers=workers)
+
+    def log(self, message):
+        self.log_lines += 1
+        if self.harness.verbose:
+            print(message)
+
+    def process_scan_job(self, job):
+        try:
+            size_at_read = os.path.getsize(job.image_path)
+        except OSError:
+            size_at_read = -1
+
+        guest = super().process_scan_job(job)
+        self.harness.record_result(job, guest, size_at_read)
+        return guest
+
+    def read_image(self, job):
+        if self.harness.args.reader == 'real':
+            return super().read_image(job)
+
+        time.sleep(self.harness.args.fake_latency * random.uniform(0.5, 1.5))
+        try:
+            with open(job.image_path, 'rb') as f:
+                f.read()
+        except OSError:
+            return None
+        fields = mrz.parse_mrz_text('\n'.join(SAMPLE_MRZ))
+        return mrz.guest_from_mrz_fields(fields, os.path.basename(job.image_path), 'soak')
+
+# ============= HARNESS =============
+class SoakHarness:
+    def __init__(self, args):
+        self.args = args
+        self.verbose = args.verbose
+        self.work_dir = tempfile.mkdtemp(prefix='mrz_soak_')
+        self.folder = os.path.join(self.work_dir, 'scan')
+        self.result_folder = os.path.join(self.work_dir, 'results')
+        os.makedirs(self.folder)
+
+        if args.sample:
+            with open(args.sample, 'rb') as f:
+                self.sample_bytes = f.read()
+        else:
+            self.sample_bytes = synthetic_scan()
+
+        # Sổ sách giữ gọn để không cộng CPU / RSS của harness vào số đo của app:
+        # ảnh có kết quả rời 'pending' ngay, ảnh bị xóa (--retain) rời 'finished'
+        self.pending = {}          # ảnh chưa có kết quả → {'created', 'size', 'kind'}
+        self.finished = {}         # ảnh đã có kết quả, còn trong thư mục → {'size', 'ok'}
+        self.finished_order = deque()   # thứ tự có kết quả → xóa ảnh cũ nhất trước
+        self.aliases = {}          # tên tạm (image_rename) → path cuối
+        self.latencies = {}        # kiểu ghi → array độ trễ lần đọc đầu (s)
+        self.duplicated = set()    # ảnh thêm khách > 1 lần
+        self.partial = set()       # ảnh bị đọc khi chưa ghi xong
+        self.written = 0
+        self.processed = 0
+        self.failed = 0            # lần đọc đầu không ra khách
+        self.unexpected = 0        # kết quả cho file không do harness ghi
+        self.ok_reads = 0          # số lần đọc ra khách (mỗi lần = 1 record trong result sink)
+        self.samples = []          # timeline: t, rss_mb, threads, pending, processed
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.writer_threads = []
+
+    # ---------- kết quả ----------
+    def record_result(self, job, guest, size_at_read):
+        with self.lock:
+            path = self.aliases.get(job.image_path, job.image_path)
+            if guest:
+                self.ok_reads += 1
+
+            info = self.pending.pop(path, None)
+            if info is not None:
+                # Lần đọc đầu: tính độ trễ, chuyển sang 'finished'
+                self.processed += 1
+                if not guest:
+                    self.failed += 1
+                self.latencies.setdefault(info['kind'], array('d')).append(time.time() - info['created'])
+                self.aliases.pop(info.get('alias'), None)
+                done = self.finished[path] = {'size': info['size'], 'ok': 0}
+                self.finished_order.append(path)
+            else:
+                done = self.finished.get(path)
+                if done is None:
+                    self.unexpected += 1
+                    return
+
+            name = os.path.basename(path)
+            if size_at_read != done['size']:
+                self.partial.add(name)
+            # Đọc lại lần nữa không sao, thêm khách 2 lần mới là lỗi
+            if guest:
+                done['ok'] += 1
+                if done['ok'] > 1:
+                    self.duplicated.add(name)
+
+    # ---------- máy scan giả lập ----------
+    def pick_kind(self):
+        r = random.random()
+        a = self.args
+        if r < a.slow_fraction:
+            return 'slow'
+        if r < a.slow_fraction + a.rename_fraction:
+            return 'rename'
+        if r < a.slow_fraction + a.rename_fraction + a.duplicate_fraction:
+            return 'duplicate'
+        if r < a.slow_fraction + a.rename_fraction + a.duplicate_fraction + a.image_rename_fraction:
+            return 'image_rename'
+        return 'normal'
+
+    def write_scan(self, kind):
+        with self.lock:
+            self.counter += 1
+            name = f"scan_{self.counter:06d}.jpg"
+        path = os.path.join(self.folder, name)
+        data = self.sample_bytes
+
+        with self.lock:
+            self.written += 1
+            self.pending[path] = {'created': time.time(), 'size': len(data), 'kind': kind}
+
+        if kind == 'slow':
+            self.write_chunks(path, data)
+        elif kind == 'rename':
+            tmp_path = path[:-4] + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        elif kind == 'image_rename':
+            # Tên tạm cũng là ảnh: watcher thấy file đang ghi dở,
+            # rồi file bị đổi tên ngay khi ghi xong (chưa kịp "đứng yên")
+            tmp_path = path[:-4] + '_tmp.jpg'
+            with self.lock:
+                self.aliases[tmp_path] = path
+                self.pending[path]['alias'] = tmp_path
+            self.write_chunks(tmp_path, data)
+            os.replace(tmp_path, path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(data)
+            if kind == 'duplicate':
+                time.sleep(random.uniform(0.2, 2.0))
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+    def write_chunks(self, path, data, chunks=5):
+        """Ghi từng phần trong slow_write_time giây"""
+        step = (len(data) + chunks - 1) // chunks
+        with open(path, 'wb') as f:
+            for i in range(0, len(data), step):
+                f.write(data[i:i + step])
+                f.flush()
+                time.sleep(self.args.slow_write_time / chunks)
+
+    def write_async(self, kind):
+        """Ghi chậm / trùng chạy song song để chồng lên burst"""
+        thread = threading.Thread(target=self.write_scan, args=(kind,),
+                                  name=f"soak-writer-{kind}", daemon=True)
+        thread.start()
+        self.writer_threads.append(thread)
+        self.writer_threads = [t for t in self.writer_threads if t.is_alive()]
+
+    def emit(self):
+        kind = self.pick_kind()
+        if kind in ('slow', 'duplicate', 'image_rename'):
+            self.write_async(kind)
+        else:
+            self.write_scan(kind)
+
+    def scanner_loop(self):
+        """Burst định kỳ + rải rác 1 ảnh giữa các burst"""
+        next_burst = time.time() + 1.0
+        next_trickle = time.time() + self.args.trickle_interval
+
+        while not self.stop_event.is_set():
+            now = time.time()
+            if now >= next_burst:
+                for _ in range(self.args.burst_size):
+                    self.emit()
+                next_burst = now + self.args.burst_interval
+            if self.args.trickle_interval > 0 and now >= next_trickle:
+                self.emit()
+                next_trickle = now + self.args.trickle_interval
+
+            self.prune_folder()
+            self.stop_event.wait(0.05)
+
+    def prune_folder(self):
+        """Giữ tối đa --retain ảnh trong thư mục (xóa ảnh cũ nhất đã có kết quả)"""
+        if self.args.retain <= 0:
+            return
+        with self.lock:
+            extra = len(self.pending) + len(self.finished) - self.args.retain
+            old = [self.finished_order.popleft() for _ in range(min(max(0, extra), len(self.finished_order)))]
+            for path in old:
+                del self.finished[path]
+
+        for path in old:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- đo ----------
+    def sample(self, app, handler, start):
+        with self.lock:
+            processed = self.processed
+            written = self.written
+        self.samples.append({
+            't': round(time.time() - start, 1),
+            'rss_mb': read_rss_mb(),
+            'threads': pipeline_thread_count(),
+            'pending': app.scheduler.pending_count(),
+            'processed': processed,
+            'written': written,
+            'processed_files': len(handler.processed_files),
+        })
+
+    def run(self):
+        args = self.args
+        config = dict(mrz.DEFAULT_CONFIG)
+        config.update({
+            'result_folder': self.result_folder,
+            'result_format': 'jsonl',
+            'quality_gate': args.quality_gate,
+        })
+        app = SoakPipeline(self, config, args.workers)
+        handler = mrz.ImageFolderHandler(app)
+        watcher = mrz.FolderWatcher(handler)
+        watcher.start([{'path': self.folder, 'recursive': False,
+                        'mode': args.mode, 'poll_interval': args.poll_interval}])
+
+        print(f"📂 Thư mục test: {self.folder}")
+        print(f"⏱️ Chạy {args.duration}s - burst {args.burst_size} ảnh / {args.burst_interval}s, "
+              f"watcher: {args.mode}, reader: {args.reader}")
+
+        start = time.time()
+        self.sample(app, handler, start)
+        scanner = threading.Thread(target=self.scanner_loop, name="soak-scanner", daemon=True)
+        scanner.start()
+
+        try:
+            while time.time() - start < args.duration:
+                time.sleep(min(args.sample_interval, max(0.1, args.duration - (time.time() - start))))
+                self.sample(app, handler, start)
+                last = self.samples[-1]
+                print(f"[{last['t']:>8.0f}s] ghi {last['written']:>6}  xong {last['processed']:>6}  "
+                      f"chờ {last['pending']:>4}  thread {last['threads']:>3}  "
+                      f"RSS {last['rss_mb'] or 0:>7.1f} MB")
+        except KeyboardInterrupt:
+            print("⏹️ Dừng sớm")
+
+        # Dừng ghi, đợi xử lý nốt
+        self.stop_event.set()
+        scanner.join()
+        for thread in self.writer_threads:
+            thread.join()
+
+        deadline = time.time() + args.grace
+        while time.time() < deadline:
+            with self.lock:
+                missing = len(self.pending)
+            if not missing and app.scheduler.is_idle():
+                break
+            time.sleep(0.5)
+        self.sample(app, handler, start)
+
+        watcher.stop()
+        app.shutdown()
+
+        report = self.build_report(time.time() - start, len(app.guests), self.count_sink_records())
+        if not args.keep:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        return report
+
+    def count_sink_records(self):
+        """Số record result sink đã ghi xuống disk"""
+        count = 0
+        for path in mrz.list_result_files(self.result_folder, '.jsonl'):
+            with open(path, 'r', encoding='utf-8') as f:
+                count += sum(1 for line in f if line.strip())
+        return count
+
+    def build_report(self, elapsed, guests, sink_records):
+        with self.lock:
+            dropped = sorted(os.path.basename(path) for path in self.pending)
+            duplicated = sorted(self.duplicated)
+            partial = sorted(self.partial)
+            by_kind = {kind: list(values) for kind, values in self.latencies.items()}
+            latencies = [value for values in by_kind.values() for value in values]
+            written = self.written
+            processed = self.processed
+            failed = self.failed
+
+        def summary(values):
+            if not values:
+                return {}
+            return {
+                'count': len(values),
+                'mean_s': round(sum(values) / len(values), 3),
+                'p50_s': round(percentile(values, 50), 3),
+                'p95_s': round(percentile(values, 95), 3),
+                'p99_s': round(percentile(values, 99), 3),
+                'max_s': round(max(values), 3),
+            }
+
+        rss = [s['rss_mb'] for s in self.samples if s['rss_mb'] is not None]
+        threads = [s['threads'] for s in self.samples]
+        rss_slope = slope_per_hour([(s['t'], s['rss_mb']) for s in self.samples])
+
+        with self.lock:
+            ok_reads = self.ok_reads
+            unexpected = self.unexpected
+
+        checks = {
+            'no_dropped': not dropped,
+            'no_duplicated': not duplicated,
+            'no_partial_reads': not partial,
+            'sink_complete': sink_records == ok_reads and guests == ok_reads,
+            'threads_bounded': not threads or max(threads) <= threads[0] + self.args.max_thread_growth,
+            # Chạy ngắn thì độ dốc RSS chủ yếu là nhiễu khởi động
+            'rss_growth_ok': (rss_slope is None or elapsed < 600
+                              or rss_slope <= self.args.max_rss_growth),
+        }
+
+        return {
+            'config': vars(self.args),
+            'elapsed_s': round(elapsed, 1),
+            'written': written,
+            'processed': processed,
+            'read_failed': failed,
+            'dropped': len(dropped),
+            'duplicated': len(duplicated),
+            'partial_reads': len(partial),
+            'unexpected_reads': unexpected,
+            'guests': guests,
+            'sink_records': sink_records,
+            'dropped_files': dropped[:50],
+            'duplicated_files': duplicated[:50],
+            'partial_files': partial[:50],
+            'latency': summary(latencies),
+            'latency_by_kind': {kind: summary(values) for kind, values in by_kind.items()},
+            'threads': {'start': threads[0] if threads else None,
+                        'max': max(threads) if threads else None,
+                        'end': threads[-1] if threads else None},
+            'rss_mb': {'start': rss[0] if rss else None,
+                       'max': max(rss) if rss else None,
+                       'end': rss[-1] if rss else None,
+                       'growth_mb_per_hour': round(rss_slope, 2) if rss_slope is not None else None},
+            'checks': checks,
+            'passed': all(checks.values()),
+            'timeline': self.samples,
+        }
+
+def print_report(report):
+    latency = report['latency']
+    print()
+    print("=" * 60)
+    print(f"📊 KẾT QUẢ SOAK TEST ({report['elapsed_s']}s)")
+    print("=" * 60)
+    print(f"Ảnh ghi: {report['written']}  |  đã xử lý: {report['processed']}  |  đọc lỗi: {report['read_failed']}")
+    print(f"Bỏ sót: {report['dropped']}  |  trùng: {report['duplicated']}  |  đọc khi chưa ghi xong: {report['partial_reads']}")
+    print(f"Khách: {report['guests']}  |  record result sink: {report['sink_records']}  |  kết quả lạ: {report['unexpected_reads']}")
+    if latency:
+        print(f"Độ trễ: p50 {latency['p50_s']}s  p95 {latency['p95_s']}s  "
+              f"p99 {latency['p99_s']}s  max {latency['max_s']}s")
+    for kind, stats in sorted(report['latency_by_kind'].items()):
+        print(f"   {kind:<12} n={stats['count']:<6} p50 {stats['p50_s']}s  p95 {stats['p95_s']}s  max {stats['max_s']}s")
+    threads = report['threads']
+    print(f"Thread: đầu {threads['start']}  max {threads['max']}  cuối {threads['end']}")
+    rss = report['rss_mb']
+    if rss['start'] is not None:
+        print(f"RSS: đầu {rss['start']:.1f} MB  max {rss['max']:.1f} MB  cuối {rss['end']:.1f} MB  "
+              f"tăng {rss['growth_mb_per_hour']} MB/giờ")
+    for name, ok in report['checks'].items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    print("✅ ĐẠT" if report['passed'] else "❌ KHÔNG ĐẠT")
+
+# ============= MAIN =============
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Soak / burst test cho luồng lắng nghe thư mục")
+    parser.add_argument('--duration', type=float, default=300, help="Thời gian chạy (giây)")
+    parser.add_argument('--burst-size', type=int, default=20, help="Số ảnh mỗi burst")
+    parser.add_argument('--burst-interval', type=float, default=30, help="Khoảng cách giữa các burst (giây)")
+    parser.add_argument('--trickle-interval', type=float, default=3, help="Ghi rải rác 1 ảnh mỗi N giây (0 = tắt)")
+    parser.add_argument('--slow-fraction', type=float, default=0.1, help="Tỉ lệ ảnh ghi chậm")
+    parser.add_argument('--slow-write-time', type=float, default=2.0, help="Thời gian ghi 1 ảnh chậm (giây)")
+    parser.add_argument('--rename-fraction', type=float, default=0.1, help="Tỉ lệ ảnh ghi .tmp rồi đổi tên")
+    parser.add_argument('--duplicate-fraction', type=float, default=0.05, help="Tỉ lệ ảnh bị ghi đè lần 2")
+    parser.add_argument('--image-rename-fraction', type=float, default=0.1,
+                        help="Tỉ lệ ảnh ghi dưới tên ảnh tạm (_tmp.jpg) rồi đổi tên")
+    parser.add_argument('--mode', choices=('native', 'poll'), default='native', help="Kiểu watcher")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Chu kỳ polling (giây)")
+    parser.add_argument('--workers', type=int, default=mrz.DEFAULT_SCAN_WORKERS, help="Số worker đọc MRZ")
+    parser.add_argument('--reader', choices=('fake', 'real'), default='fake',
+                        help="fake: giả lập thời gian OCR; real: đọc MRZ thật (cần --sample)")
+    parser.add_argument('--fake-latency', type=float, default=0.8, help="Thời gian OCR giả lập trung bình (giây)")
+    parser.add_argument('--sample', help="Ảnh passport mẫu để ghi (bắt buộc với --reader real)")
+    parser.add_argument('--quality-gate', choices=('reject', 'flag', 'off'),
+                        default=mrz.DEFAULT_CONFIG['quality_gate'], help="Chế độ quality gate")
+    parser.add_argument('--retain', type=int, default=2000, help="Số ảnh tối đa giữ trong thư mục (0 = giữ hết)")
+    parser.add_argument('--sample-interval', type=float, default=10, help="Chu kỳ đo RSS / thread (giây)")
+    parser.add_argument('--grace', type=float, default=60, help="Thời gian đợi xử lý nốt sau khi dừng ghi (giây)")
+    parser.add_argument('--max-thread-growth', type=int, default=10, help="Số thread tăng thêm tối đa cho phép")
+    parser.add_argument('--max-rss-growth', type=float, default=50, help="Tốc độ tăng RSS tối đa (MB/giờ)")
+    parser.add_argument('--report', help="Ghi báo cáo JSON ra file")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại thư mục test")
+    parser.add_argument('--verbose', action='store_true', help="In log của app")
+    args = parser.parse_args(argv)
+
+    if args.reader == 'real' and not args.sample:
+        parser.error("--reader real cần --sample <ảnh passport>")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = SoakHarness(args).run()
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Đã lưu báo cáo: {args.report}")
+
+    return 0 if report['passed'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())